@@ -2,6 +2,7 @@
 
 import sys
 import os
+import numpy as np
 import pandas as pd
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel, QPushButton, QFileDialog, QMessageBox
@@ -13,40 +14,40 @@ from PySide6.QtWidgets import QSpinBox
 # -------------------------------
 # Summary generation functions
 # -------------------------------
+# Callers convert entry_date/exit_date to datetime once; these helpers only
+# read the frame they are given and never copy or modify it.
 
-def generate_daily_summary(df_results: pd.DataFrame) -> pd.DataFrame:
-    df = df_results.copy()
-    df['entry_date'] = pd.to_datetime(df['entry_date'])
-    df['exit_date'] = pd.to_datetime(df['exit_date'])
-
+def generate_daily_summary(df: pd.DataFrame) -> pd.DataFrame:
     # Generate full calendar date range
     full_dates = pd.date_range(df['entry_date'].min(), df['exit_date'].max(), freq='D')
 
-    # Calculate stocks held at end of each day
-    held_counts = pd.Series([
-        df[(df['entry_date'] <= date) & (df['exit_date'] >= date)].shape[0]
-        for date in full_dates
-    ], index=full_dates)
+    # Calculate stocks held at end of each day: +1 on entry, -1 the day after exit
+    n_days = len(full_dates)
+    min_date = full_dates[0].to_datetime64()
+    start = (df['entry_date'].values - min_date).astype('timedelta64[D]').astype(np.int64)
+    end = (df['exit_date'].values - min_date).astype('timedelta64[D]').astype(np.int64) + 1
+    delta = np.bincount(start, minlength=n_days + 1) - np.bincount(end, minlength=n_days + 1)
+    held_counts = pd.Series(np.cumsum(delta)[:n_days], index=full_dates)
 
     # Group by entry_date for daily trade stats
     grouped = df.groupby('entry_date')
-    stats_df = pd.DataFrame({
-        'return_pct (sum)': grouped['return_pct'].sum(),
-        '# of Trades (sum)': grouped.size(),
-        'max_gain_pct (average)': grouped['max_gain_pct'].mean(),
-        'max_drawdown (average)': grouped['max_drawdown'].mean(),
-        'spread_ma5_10 (average)': grouped['spread_ma5_10'].mean(),
-        'risk_to_reward (sum)': grouped['risk_to_reward'].sum(),
-        'risk_to_reward (average)': grouped['risk_to_reward'].mean(),
-        '# of stocks bought (sum)': grouped.size(),
+    stats_df = grouped.agg(**{
+        'return_pct (sum)': ('return_pct', 'sum'),
+        '# of Trades (sum)': ('return_pct', 'size'),
+        'max_gain_pct (average)': ('max_gain_pct', 'mean'),
+        'max_drawdown (average)': ('max_drawdown', 'mean'),
+        'spread_ma5_10 (average)': ('spread_ma5_10', 'mean'),
+        'risk_to_reward (sum)': ('risk_to_reward', 'sum'),
+        'risk_to_reward (average)': ('risk_to_reward', 'mean'),
     })
+    stats_df['# of stocks bought (sum)'] = stats_df['# of Trades (sum)']
 
     # Count how many stocks exited on each day
     exit_counts = df['exit_date'].value_counts().rename('# of stocks sold (sum)')
 
     # Reindex to full calendar range for alignment
     summary = stats_df.reindex(full_dates).fillna(0)
-    summary['# of stocks sold (sum)'] = full_dates.map(exit_counts).fillna(0).astype(int)
+    summary['# of stocks sold (sum)'] = exit_counts.reindex(full_dates, fill_value=0).astype(np.int64).values
     summary['# of stocks held (EOD)'] = held_counts
 
     summary = summary.round(2)
@@ -61,17 +62,16 @@ def generate_daily_summary(df_results: pd.DataFrame) -> pd.DataFrame:
     return summary
 
 
-def generate_monthly_summary(df_results: pd.DataFrame) -> pd.DataFrame:
-    df = df_results.copy()
-    df['entry_date'] = pd.to_datetime(df['entry_date'])
-    df['month'] = df['entry_date'].dt.to_period('M').astype(str)
+def generate_monthly_summary(df: pd.DataFrame) -> pd.DataFrame:
+    # Group on the Period's integer ordinals; labels are formatted after aggregation
+    month = df['entry_date'].dt.to_period('M').rename('month')
 
-    grouped = df.groupby('month')
+    grouped = df.groupby(month)
     return_sum = grouped['return_pct'].sum()
     risk_avg = grouped['risk_to_reward'].mean()
     trade_counts = grouped.size()
-    win_counts = grouped.apply(lambda g: (g['return_pct'] > 0).sum())
-    lose_counts = grouped.apply(lambda g: (g['return_pct'] <= 0).sum())
+    win_counts = (df['return_pct'] > 0).astype(np.int64).groupby(month).sum()
+    lose_counts = (df['return_pct'] <= 0).astype(np.int64).groupby(month).sum()
     win_ratios = (win_counts / trade_counts).round(2)
 
     monthly = pd.DataFrame({
@@ -83,23 +83,29 @@ def generate_monthly_summary(df_results: pd.DataFrame) -> pd.DataFrame:
         'risk_to_reward (average)': risk_avg,
         '# stocks traded (sum)': trade_counts
     })
+    monthly.index = monthly.index.astype(str)
 
     monthly = monthly.round(2)
+    # Reduce down the columns before transposing, then transpose once
+    totals = monthly.sum(axis=0)
+    means = monthly.mean(axis=0)
     monthly = monthly.T
-    monthly['Total'] = monthly.sum(axis=1)
-    monthly['Average'] = monthly.mean(axis=1)
+    monthly['Total'] = totals.reindex(monthly.index)
+    monthly['Average'] = means.reindex(monthly.index)
     return monthly
 
 
-def generate_weekly_summary(df_results: pd.DataFrame) -> pd.DataFrame:
-    df = df_results.copy()
-    df['entry_date'] = pd.to_datetime(df['entry_date'])
-    df['week'] = df['entry_date'].dt.strftime('%G-W%V')
+def generate_weekly_summary(df: pd.DataFrame) -> pd.DataFrame:
+    # Integer ISO year*100 + week key; the 'YYYY-Www' label is built after aggregation.
+    # Trades without an entry_date have no week (the old strftime key dropped them too)
+    df = df[df['entry_date'].notna()]
+    iso = df['entry_date'].dt.isocalendar()
+    week = (iso['year'] * 100 + iso['week']).astype(np.int32).rename('week')
 
-    grouped = df.groupby('week')
+    grouped = df.groupby(week)
     return_sum = grouped['return_pct'].sum()
-    win_counts = grouped.apply(lambda g: (g['return_pct'] > 0).sum())
-    lose_counts = grouped.apply(lambda g: (g['return_pct'] <= 0).sum())
+    win_counts = (df['return_pct'] > 0).astype(np.int64).groupby(week).sum()
+    lose_counts = (df['return_pct'] <= 0).astype(np.int64).groupby(week).sum()
     total_counts = grouped.size()
     win_ratios = (win_counts / total_counts).round(2)
 
@@ -109,34 +115,50 @@ def generate_weekly_summary(df_results: pd.DataFrame) -> pd.DataFrame:
         'Lose (#)': lose_counts,
         'Win Ratio (Win#/# of Trades)': win_ratios,
     })
+    summary.index = pd.Index([f"{k // 100}-W{k % 100:02d}" for k in summary.index], name='week')
 
     summary = summary.round(2)
     return summary
 
 
+def _max_runs(vals: np.ndarray) -> tuple:
+    """Longest run of positive and of negative values, found in one pass."""
+    if vals.size == 0:
+        return 0, 0
+    sign = np.sign(vals)
+    # Run boundaries are wherever the sign changes (NaN never equals itself)
+    bounds = np.flatnonzero(np.r_[True, sign[1:] != sign[:-1], True])
+    lengths = np.diff(bounds)
+    run_sign = sign[bounds[:-1]]
+    return int(lengths[run_sign > 0].max(initial=0)), int(lengths[run_sign < 0].max(initial=0))
+
+
 def calculate_max_streaks(df: pd.DataFrame) -> tuple:
-    df = df.copy()
-    df['entry_date'] = pd.to_datetime(df['entry_date'])
     daily_returns = df.groupby('entry_date')['return_pct'].sum().sort_index()
 
-    win_streak = max_win = 0
-    for val in daily_returns:
-        if val > 0:
-            win_streak += 1
-            max_win = max(max_win, win_streak)
-        else:
-            win_streak = 0
-
-    loss_streak = max_loss = 0
-    for val in daily_returns:
-        if val < 0:
-            loss_streak += 1
-            max_loss = max(max_loss, loss_streak)
-        else:
-            loss_streak = 0
+    max_win, max_loss = _max_runs(daily_returns.to_numpy())
 
     return max_win, max_loss
 
+def _excel_engine() -> str:
+    # xlsxwriter serialises considerably faster than openpyxl; fall back when it
+    # is not installed. Its constant_memory mode is not used because pandas
+    # emits cells column by column, which that row-streaming mode silently drops.
+    try:
+        import xlsxwriter  # noqa: F401
+        return 'xlsxwriter'
+    except ImportError:
+        return 'openpyxl'
+
+
+def save_summary_workbook(output_path: str, daily: pd.DataFrame,
+                          weekly: pd.DataFrame, monthly: pd.DataFrame) -> None:
+    with pd.ExcelWriter(output_path, engine=_excel_engine()) as writer:
+        daily.to_excel(writer, sheet_name='Daily Summary')
+        weekly.to_excel(writer, sheet_name='Weekly Summary')
+        monthly.to_excel(writer, sheet_name='Monthly Summary')
+
+
 class SummaryApp(QWidget):
     def __init__(self):
         super().__init__()
@@ -189,11 +211,20 @@ class SummaryApp(QWidget):
         self.layout.addWidget(self.status_label)
 
         self.selected_path = None
+        self._df = None  # parsed once per selected file, reused by every summary run
 
     def select_file(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select Excel File", "", "Excel Files (*.xlsx *.xls)")
         if path:
+            try:
+                df = pd.read_excel(path)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to read file:\n{str(e)}")
+                return
+            df.columns = df.columns.map(str).str.strip()
+
             self.selected_path = path
+            self._df = df
             self.file_label.setText(f"Selected: {os.path.basename(path)}")
             self.run_button.setEnabled(True)
             self.peak_button.setEnabled(True)
@@ -202,13 +233,13 @@ class SummaryApp(QWidget):
 
     def generate_summary(self):
         try:
-            df = pd.read_excel(self.selected_path)
-            df.columns = df.columns.map(str).str.strip()
+            df = self._df.copy()
 
             print("Columns in input file:", df.columns.tolist())
 
             # --- Filter based on Days_took_to_Entry ---
             df['entry_date'] = pd.to_datetime(df['entry_date'])
+            df['exit_date'] = pd.to_datetime(df['exit_date'])
             selected_day = self.day_spinbox.value()
             first_day_df = df[df['Days_took_to_Entry'] == selected_day]
 
@@ -227,10 +258,7 @@ class SummaryApp(QWidget):
             base = os.path.splitext(os.path.basename(self.selected_path))[0]
             output_path = os.path.join(folder, f"{base}_Summary.xlsx")
 
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                daily.to_excel(writer, sheet_name='Daily Summary')
-                weekly.to_excel(writer, sheet_name='Weekly Summary')
-                monthly.to_excel(writer, sheet_name='Monthly Summary')
+            save_summary_workbook(output_path, daily, weekly, monthly)
 
             self.streak_label.setText(f"✅ Max Win Streak: {win_streak} | Max Loss Streak: {loss_streak}")
             self.status_label.setText(f"📄 Summary saved to: {output_path}")
@@ -240,8 +268,7 @@ class SummaryApp(QWidget):
 
     def generate_peak_summary(self):
         try:
-            df = pd.read_excel(self.selected_path)
-            df.columns = df.columns.map(str).str.strip()
+            df = self._df.copy()
 
             df['entry_date'] = pd.to_datetime(df['entry_date'])
             if 'exit_date' in df.columns:
@@ -263,10 +290,7 @@ class SummaryApp(QWidget):
             base = os.path.splitext(os.path.basename(self.selected_path))[0]
             output_path = os.path.join(folder, f"{base}_PreEntryPeakSummary.xlsx")
 
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                daily.to_excel(writer, sheet_name='Daily Summary')
-                weekly.to_excel(writer, sheet_name='Weekly Summary')
-                monthly.to_excel(writer, sheet_name='Monthly Summary')
+            save_summary_workbook(output_path, daily, weekly, monthly)
 
             self.streak_label.setText(f"✅ Max Win Streak: {win_streak} | Max Loss Streak: {loss_streak}")
             self.status_label.setText(f"📄 Summary saved to: {output_path}")
@@ -28,37 +28,29 @@ def process_file(file_path):
         df = df.dropna()
 
         # Bin X-axis by 1-unit ranges
-        df['bin'] = df[x_col].astype(int)
-        grouped = df.groupby('bin')[y_col].mean().reset_index()
-        grouped['bin_mid'] = grouped['bin'] + 0.5
-
-        # Save output CSV to same folder
-        output_dir = os.path.dirname(file_path)
-        output_file = os.path.join(output_dir, "binned_output.csv")
-        grouped.to_csv(output_file, index=False)
-
-        # Group values per bin (for boxplot)
-        grouped_data = df.groupby('bin')[y_col].apply(list)
-        bin_midpoints = [b + 0.5 for b in grouped_data.index]
+        df['bin'] = np.trunc(df[x_col].to_numpy()).astype(np.int32)
 
         # Group stats: mean and std for each bin
         stats = df.groupby('bin')[y_col].agg(['mean', 'std']).reset_index()
         stats['bin_mid'] = stats['bin'] + 0.5
 
+        # Save output CSV to same folder (bin, mean per bin, bin midpoint)
+        output_dir = os.path.dirname(file_path)
+        output_file = os.path.join(output_dir, "binned_output.csv")
+        stats[['bin', 'mean', 'bin_mid']].rename(columns={'mean': y_col}).to_csv(output_file, index=False)
+
         # Plot custom box: mean ± 1 std
         plt.figure(figsize=(12, 6))
 
-        # Draw box as vertical bar from (mean - std) to (mean + std)
-        for i, row in stats.iterrows():
-            x = row['bin_mid']
-            mean = row['mean']
-            std = row['std']
+        x = stats['bin_mid'].to_numpy()
+        mean = stats['mean'].to_numpy()
+        std = stats['std'].to_numpy()
 
-            # Draw the std box
-            plt.fill_between([x - 0.3, x + 0.3], mean - std, mean + std, color='lightblue', alpha=0.6)
+        # Draw every std box as a vertical bar from (mean - std) to (mean + std) in one call
+        plt.bar(x, 2 * std, bottom=mean - std, width=0.6, color='lightblue', alpha=0.6)
 
-            # Draw the mean marker
-            plt.plot(x, mean, 'o', color='red')
+        # Draw the mean markers
+        plt.plot(x, mean, 'o', color='red')
 
         plt.title(f"{y_col} by {x_col} Bin (Mean ± 1 Std)")
         plt.xlabel(f"{x_col} Bin Midpoint")
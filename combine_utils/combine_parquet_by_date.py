@@ -2,10 +2,78 @@
 
 import os
 import re
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from collections import deque
 from pathlib import Path
 from typing import Literal
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+# '일자' is stored dictionary-encoded: one timestamp per file, an int8 index per row
+DATE_FIELD = pa.field("일자", pa.dictionary(pa.int8(), pa.timestamp("ns")))
+
+
+def _unified_schema(schemas) -> pa.Schema:
+    """
+    Output schema covering every column of every input file.
+    Types are promoted the way pd.concat would (int + float → float); a column that
+    is numeric in some files and text in others becomes text. 종목코드 is always text.
+    """
+    by_name = {}
+    for schema in schemas:
+        for field in schema:
+            by_name.setdefault(field.name, []).append(field)
+
+    fields = [DATE_FIELD]
+    for name, variants in by_name.items():
+        if name == "일자":
+            continue
+        if name == "종목코드":
+            fields.append(pa.field(name, pa.string()))
+            continue
+        try:
+            merged = pa.unify_schemas(
+                [pa.schema([f]) for f in variants], promote_options="permissive"
+            ).field(name)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            merged = pa.field(name, pa.string())
+        fields.append(merged)
+    return pa.schema(fields)
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Reorder/cast table to schema; columns the file does not have are filled with nulls."""
+    columns = [
+        table[field.name].cast(field.type) if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _read_one(file: Path, date: pd.Timestamp) -> pa.Table:
+    """Read one per-date parquet file as an Arrow table tagged with its '일자'."""
+    # Drop per-file pandas metadata; the writer uses _unified_schema and _conform instead
+    table = pq.read_table(file, memory_map=True).replace_schema_metadata(None)
+
+    # Force 종목코드 to string with leading zeros
+    if "종목코드" in table.column_names:
+        idx = table.schema.get_field_index("종목코드")
+        codes = pc.utf8_lpad(pc.cast(table["종목코드"], pa.string()), width=6, padding="0")
+        table = table.set_column(idx, "종목코드", codes)
+
+    # '일자' is constant per file: store the date once and point every row at it
+    indices = pa.array(np.zeros(table.num_rows, dtype=np.int8))
+    dates = pa.DictionaryArray.from_arrays(indices, pa.array([date], pa.timestamp("ns")))
+    table = table.append_column("일자", dates)
+
+    # 👉 Move '일자' column to the front (schema-only, no row data is copied)
+    return table.select(["일자"] + [c for c in table.column_names if c != "일자"])
 
 
 def combine_parquet_files(
@@ -13,23 +81,32 @@ def combine_parquet_files(
     output_folder: str,
     investor_type: Literal["외국인", "기관합계"],
     progress_callback=None
-):
+) -> list:
     """
     Combine all .parquet files from a folder into a single file with '일자' column.
 
+    Files are streamed into the output one at a time, so peak memory stays
+    around a handful of input files regardless of how many dates are combined.
+    The output schema is the union of every file's columns, read from the
+    footers up front; columns a file lacks are written as nulls.
+
     Args:
         source_folder: path containing raw per-stock .parquet files
         output_folder: path to save the final combined file
         investor_type: '외국인' or '기관합계'
+
+    Returns:
+        Names of the files that could not be read or combined (empty if none).
     """
     source_path = Path(source_folder)
     output_path = Path(output_folder)
     output_path.mkdir(parents=True, exist_ok=True)
 
     date_pattern = re.compile(r"(\d{8})")  # ✅ Match any 8-digit date
-    combined_dfs = []
     skipped_files = 0
 
+    pairs = []
+    parsed_dates = {}  # several files can share a date; parse each string once
     for file in source_path.glob("*.parquet"):
         match = date_pattern.search(file.name)
         if not match:
@@ -38,39 +115,72 @@ def combine_parquet_files(
             continue
 
         date_str = match.group(1)
+        if date_str not in parsed_dates:
+            parsed_dates[date_str] = pd.to_datetime(date_str, format="%Y%m%d")
+        pairs.append((file, parsed_dates[date_str]))
+
+    # Footers only: settle the output schema before any row data is read
+    failed = []
+    schemas = []
+    readable = []
+    for file, date in pairs:
         try:
-            df = pd.read_parquet(file)
-
-            # Force 종목코드 to string with leading zeros
-            if "종목코드" in df.columns:
-                df["종목코드"] = df["종목코드"].astype(str).str.zfill(6)
-
-            df["일자"] = pd.to_datetime(date_str)
-            combined_dfs.append(df)
-
-            if progress_callback:
-                progress_callback(1)
-
+            schemas.append(pq.read_schema(file))
+            readable.append((file, date))
         except Exception as e:
             print(f"⚠️ Failed to read {file.name}: {e}")
-
-    print(f"📦 Combined {len(combined_dfs)} files, skipped {skipped_files}")
-
-    if not combined_dfs:
-        print("⚠️ No valid files to combine.")
-        return
-
-    full_df = pd.concat(combined_dfs, ignore_index=True)
-
-    # 👉 Move '일자' column to the front
-    cols = full_df.columns.tolist()
-    if "일자" in cols:
-        cols.insert(0, cols.pop(cols.index("일자")))
-        full_df = full_df[cols]
+            failed.append(file.name)
+    pairs = readable
+    schema = _unified_schema(schemas)
 
     today_str = datetime.today().strftime("%Y%m%d")
     out_name = f"Combined_{investor_type}순매수_{today_str}.parquet"
     out_path = output_path / out_name
-    full_df.to_parquet(out_path, index=False)
+
+    writer = None
+    written_files = 0
+    max_workers = os.cpu_count() or 1
+
+    # pyarrow releases the GIL while decoding, so threads overlap IO and decode.
+    # Only a small window of reads is in flight, and results are written in
+    # submission order to keep the output row order stable.
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            queue = iter(pairs)
+            pending = deque()
+            for file, date in queue:
+                pending.append((file, pool.submit(_read_one, file, date)))
+                if len(pending) >= max_workers * 2:
+                    break
+
+            while pending:
+                file, future = pending.popleft()
+                next_pair = next(queue, None)
+                if next_pair is not None:
+                    pending.append((next_pair[0], pool.submit(_read_one, *next_pair)))
+
+                try:
+                    table = _conform(future.result(), schema)
+                    if writer is None:
+                        writer = pq.ParquetWriter(out_path, schema, compression="zstd")
+                    writer.write_table(table)
+                    written_files += 1
+
+                    if progress_callback:
+                        progress_callback(1)
+
+                except Exception as e:
+                    print(f"⚠️ Failed to read {file.name}: {e}")
+                    failed.append(file.name)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    print(f"📦 Combined {written_files} files, skipped {skipped_files}, failed {len(failed)}")
+
+    if writer is None:
+        print("⚠️ No valid files to combine.")
+        return failed
 
     print(f"✅ Combined file saved: {out_path}")
+    return failed
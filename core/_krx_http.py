@@ -0,0 +1,69 @@
+# core/_krx_http.py
+"""
+KRX file-download endpoints shared by PermManager and ranking_utils.
+
+Every KRX export is the same two-step dance: POST a payload to get a one-time
+code (OTP), then POST that code to receive the CSV bytes. The payloads only
+differ in the screen they come from, so each export is registered once in
+_OTP_KINDS and callers pass just the per-request fields.
+"""
+
+from core.http_session import get_session as session
+
+_OTP_URL = "https://data.krx.co.kr/comm/fileDn/GenerateOTP/generate.cmd"
+_DOWNLOAD_URL = "https://data.krx.co.kr/comm/fileDn/download_csv/download.cmd"
+
+_MDI_REFERER = "https://data.krx.co.kr/contents/MDC/MDI/mdiLoader/index.cmd?menuId=MDC0201020202"
+_OUTER_REFERER = "https://data.krx.co.kr/contents/MDC/MDI/outerLoader/index.cmd?screenId=MDCSTAT024"
+
+_OTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+    "Origin": "https://data.krx.co.kr",
+    "X-Requested-With": "XMLHttpRequest"
+}
+_DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Referer": "https://data.krx.co.kr"
+}
+
+# kind → (Referer, fixed payload fields)
+_OTP_KINDS = {
+    "tradability": (_MDI_REFERER, {
+        "url": "dbms/MDC/STAT/standard/MDCSTAT02001",
+        "mktId": "ALL",
+    }),
+    "index_trend": (_MDI_REFERER, {
+        "url": "dbms/MDC/STAT/standard/MDCSTAT00301",
+        "share": "2",
+        "money": "3",
+    }),
+    "ranking": (_OUTER_REFERER, {
+        "url": "dbms/MDC/STAT/standard/MDCSTAT02401",
+        "mktId": "ALL",
+        "share": "1",
+        "money": "1",
+    }),
+}
+
+
+def generate_otp(kind, **params):
+    """Request a download code for one of the _OTP_KINDS exports; params fill in the rest."""
+    referer, fields = _OTP_KINDS[kind]
+    data = {
+        "name": "fileDown",
+        "locale": "ko_KR",
+        "csvxls_isNo": "false",
+        **fields,
+        **params,
+    }
+    response = session().post(_OTP_URL, headers={**_OTP_HEADERS, "Referer": referer}, data=data)
+    response.raise_for_status()
+    return response.text
+
+
+def download_by_otp(otp_code):
+    response = session().post(_DOWNLOAD_URL, headers=_DOWNLOAD_HEADERS, data={"code": otp_code})
+    response.raise_for_status()
+    return response.content
@@ -4,13 +4,21 @@ import argparse
 
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
 from datetime import timedelta
 import os
+from concurrent.futures import ProcessPoolExecutor
 from openpyxl.chart.series import SeriesLabel
 from openpyxl.chart import LineChart, Reference
 
 from openpyxl.utils import get_column_letter
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the scan loops then run as plain Python
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 
 # Read trigger parameters from environment variables, with defaults
 TRIGGER_RATE = float(os.environ.get("TRIGGER_RATE", 10))
@@ -29,6 +37,11 @@ STRATEGY_ID = 'ma5_support_v1.20.7'
 # Placeholder input path — fill this in manually
 INPUT_FILE_PATH = 'PATH/TO/Enhanced_000000_ma5support_v1.parquet'
 
+# Columns the backtest reads; anything else in the enhanced parquet is not loaded
+BACKTEST_COLUMNS = ['일자', '종목코드', '종목명', '시가', '고가', '저가', '종가',
+                    '거래대금', '등락률', 'MA_5', 'MA_10', 'MA_20', 'MA_60', 'MA_120',
+                    '외국인_순매수', '기관_순매수']
+
 
 
 # -----------------------------
@@ -44,20 +57,109 @@ def calculate_return(entry_price, exit_price):
     """Return % return between entry and exit prices."""
     return round((exit_price - entry_price) / entry_price * 100, 2)
 
-def calculate_slope(series, window=3):
-    """Simple slope: linear fit over window days ending at current day."""
-    if len(series) < window:
-        return np.nan
-    x = np.arange(window)
-    y = np.array(series)[-window:]
-
-    coeffs = np.polyfit(x, y, 1)
-    return round(coeffs[0], 4)  # slope
+def calculate_slope(values, window=3):
+    """Linear-fit slope over the window days ending at each row (NaN until a full window)."""
+    # Closed-form least squares on x = 0..window-1: sum((x - x̄) * y) / sum((x - x̄)²)
+    x = np.arange(window) - (window - 1) / 2
+    slopes = np.full(len(values), np.nan)
+    if len(values) >= window:
+        slopes[window - 1:] = np.correlate(np.asarray(values, dtype=float), x, 'valid') / (x @ x)
+    return np.round(slopes, 4)
 
 def is_valid_entry(row):
     """Returns True if entry conditions are met. Currently checks for 정배열 only."""
     return row['MA_5'] > row['MA_10'] > row['MA_20']
 
+# Exit notes/outcomes by the code _scan_exit returns
+EXIT_NOTES = (
+    "both hit — gap-down below MA10 → exited at open (loss)",
+    "both hit — MA10 breached intraday → exited at MA10 (loss)",
+    "target hit first",
+    "gap-down below MA10 → exited at open",
+    "intraday MA10 breach → exited at MA10",
+)
+EXIT_OUTCOMES = ('loss', 'loss', 'win', 'loss', 'loss')
+
+# Column order of the result tuples run_backtest returns
+RESULT_COLUMNS = (
+    '종목코드', '종목명', '테마명', 'trigger_date', 'entry_date', 'exit_date', 'entry_price',
+    'exit_price', 'return_pct', 'days_held', 'target_price', 'outcome', 'note',
+    'max_gain_pct', 'max_drawdown', 'spread_ma5_10', 'spread_ma5_20', '정배열_5_10_20_60',
+    '정배열_5_10_20_60_120', 'trigger_intra_high_pct', 'slope_ma5', 'slope_ma10',
+    'slope_ma20', '외국인_순매수', '기관_순매수', 'entry_id', 'exit_id', 'trigger_rate_used',
+    'trigger_volume_used', 'trigger_foreign_used', 'trigger_institution_used',
+    'risk_to_reward', 'pre_entry_peak_return_pct', 'Days_took_to_Entry',
+)
+
+@njit(cache=True)
+def _scan_entry(start, lows, highs, opens, closes, ma5s, ma10s, ma20s):
+    """Entry scan (MA5 cross-down rule) from row start; returns (entry_idx, entry_price), entry_idx -1 if none."""
+    for i in range(start, len(lows)):
+        ma5 = ma5s[i]
+        ma10 = ma10s[i]
+        open_price = opens[i]
+
+        # 🚩 Condition 1: any of the four prices dips below MA5
+        # (the high can only be below MA5 if the low is as well)
+        if lows[i] < ma5 or open_price < ma5 or closes[i] < ma5:
+            if open_price < ma10:
+                return -1, np.nan
+
+            # ✅ Improved logic: separate gap-down vs overlap cases
+            if open_price < ma5:
+                # Gap-down under MA5, but above MA10 → enter at open
+                entry_price = open_price
+            elif lows[i] <= ma5 and ma5 <= highs[i]:
+                # Ideal overlap → enter at MA5
+                entry_price = ma5
+            else:
+                # Fallback → enter at open
+                entry_price = open_price
+
+            # 🚩 Optional filters: MA5/MA10 spread of at least 3%, and 정배열 as in is_valid_entry
+            if (ma5 - ma10) / ma10 * 100 < 3:
+                return -1, np.nan
+            if not (ma5 > ma10 and ma10 > ma20s[i]):
+                return -1, np.nan
+
+            return i, entry_price
+    return -1, np.nan
+
+@njit(cache=True)
+def _scan_exit(entry_idx, entry_price, target_price, lows, highs, opens, ma10s):
+    """Exit scan from the entry day; returns (exit_idx, exit_price, exit_code, max_drawdown), exit_idx -1 if none."""
+    max_drawdown = 0.0
+    for i in range(entry_idx, len(lows)):
+        low = lows[i]
+        ma10 = ma10s[i]
+        open_price = opens[i]
+        opened_below_ma10 = open_price < ma10
+
+        drawdown = (low - entry_price) / entry_price * 100
+        if drawdown < max_drawdown:
+            max_drawdown = drawdown
+
+        hit_target = highs[i] >= target_price
+        hit_ma10 = low <= ma10 or opened_below_ma10
+
+        # 🚫 Same day target and MA10: conservative exit, MA10 hit wins over target
+        if hit_target and hit_ma10:
+            if opened_below_ma10:
+                return i, open_price, 0, max_drawdown
+            return i, ma10, 1, max_drawdown
+
+        # ✅ Disallow same-day profit-only exits (only allow same-day loss)
+        if i == entry_idx and hit_target:
+            continue
+
+        if hit_target:
+            return i, target_price, 2, max_drawdown
+        if hit_ma10:
+            if opened_below_ma10:
+                return i, open_price, 3, max_drawdown
+            return i, ma10, 4, max_drawdown
+    return -1, np.nan, -1, max_drawdown
+
 # -----------------------------
 # Main Simulation Logic
 # -----------------------------
@@ -66,7 +168,7 @@ def run_backtest(df: pd.DataFrame, stock_code: str, stock_name: str,
                  min_rate: float, max_rate: float,
                  min_volume: float, max_volume: float,
                  min_foreign: float, min_institution: float,
-                 manual_trigger_date=None) -> list:
+                 manual_trigger_date=None, assume_sorted=False) -> list:
     # Convert string arguments (from GUI) into proper numeric types
     try:
         min_rate = float(min_rate) if min_rate != "" else None
@@ -81,339 +183,269 @@ def run_backtest(df: pd.DataFrame, stock_code: str, stock_name: str,
 
     results = []
 
-    df = df.sort_values('일자').reset_index(drop=True)
+    # Callers that pass stocks already in date order (main sorts once globally) skip the sort
+    if not assume_sorted:
+        df = df.sort_values('일자')
+    df = df.reset_index(drop=True)
 
     waiting_for_ma20_dip = False
+    waiting_since = -1
     last_exit_idx = -1
 
-    for idx, row in df.iterrows():
-        if idx == 0:
-            continue
-
-        # If using manual trigger mode, skip all rows except the trigger date
-        if manual_trigger_date is not None:
-            if row['일자'].date() != manual_trigger_date.date():
-                continue
-
-
+    rate = df['등락률'].to_numpy()
+    volume = df['거래대금'].to_numpy()
+    dates = df['일자'].tolist()
+    # Prices as float64 so the scan functions see one fixed signature
+    opens = df['시가'].to_numpy(dtype=np.float64)
+    highs = df['고가'].to_numpy(dtype=np.float64)
+    lows = df['저가'].to_numpy(dtype=np.float64)
+    closes = df['종가'].to_numpy(dtype=np.float64)
+    ma5s = df['MA_5'].to_numpy(dtype=np.float64)
+    ma10s = df['MA_10'].to_numpy(dtype=np.float64)
+    ma20s = df['MA_20'].to_numpy(dtype=np.float64)
+    prev_rate = df['등락률'].shift(1).to_numpy()
+    prev_close = df['종가'].shift(1).to_numpy()
+    no_flow = np.zeros(len(df))
+    has_foreign = '외국인_순매수' in df.columns
+    has_institution = '기관_순매수' in df.columns
+    foreign = df['외국인_순매수'].to_numpy() if has_foreign else no_flow
+    institution = df['기관_순매수'].to_numpy() if has_institution else no_flow
+    theme = df['manual_theme'].iloc[0] if 'manual_theme' in df.columns and not df.empty else None
+    slope5 = calculate_slope(ma5s)
+    slope10 = calculate_slope(ma10s)
+    slope20 = calculate_slope(ma20s)
+
+    # === Trigger mask: every per-row trigger condition, evaluated column-wise ===
+    # The rejections are written as ~(reject) so NaN moving averages behave as
+    # they did row by row (a NaN comparison never rejects).
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trigger = (prev_rate > -10) & (closes >= ma5s * 1.05)
+        # 🚫 Reject trigger if MA20 is more than 4% above MA10
+        trigger &= ~((ma20s - ma10s) / ma10s * 100 > 4)
+        # 🚫 Reject trigger if MA10 is more than 5% above MA5
+        trigger &= ~((ma10s - ma5s) / ma5s * 100 > 5)
+        # 🚫 Skip if previous day's open was a severe gap-down (>10%)
+        trigger &= ~((opens - prev_close) / prev_close * 100 < -10)
+    if min_rate is not None:
+        trigger &= rate > min_rate
+    if max_rate is not None:
+        trigger &= rate < max_rate
+    if min_volume is not None:
+        trigger &= volume > min_volume
+    if max_volume is not None:
+        trigger &= volume < max_volume
+    if min_foreign is not None:
+        trigger &= foreign > min_foreign
+    if min_institution is not None:
+        trigger &= institution > min_institution
+    trigger[0] = False
+
+    # ✅ Flat-day filter: no 3+ consecutive flat (0%) days in the past 20 days.
+    # three_flat[j] marks a run of three zeros ending at j; the runs that fit
+    # inside rows idx-20 .. idx-1 end in [max(0, idx-20) + 2, idx - 1].
+    is_flat = rate == 0
+    three_flat = np.zeros(len(df), dtype=bool)
+    three_flat[2:] = is_flat[:-2] & is_flat[1:-1] & is_flat[2:]
+    runs_before = np.concatenate(([0], np.cumsum(three_flat)))
+    rows = np.arange(len(df))
+    window_lo = np.minimum(np.maximum(rows - 20, 0) + 2, rows)
+    trigger &= runs_before[rows] == runs_before[window_lo]
+
+    # If using manual trigger mode, skip all rows except the trigger date
+    if manual_trigger_date is not None:
+        trigger &= (df['일자'].dt.normalize() == pd.Timestamp(manual_trigger_date).normalize()).to_numpy()
+
+    # MA spreads and 정배열 flags, read at each trade's entry row
+    ma60s = df['MA_60'].to_numpy(dtype=np.float64)
+    ma120s = df['MA_120'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spreads_ma5_10 = (ma5s - ma10s) / ma10s * 100
+        spreads_ma5_20 = (ma5s - ma20s) / ma20s * 100
+    aligned_to_60 = (ma5s > ma10s) & (ma10s > ma20s) & (ma20s > ma60s)
+    aligned_to_120 = aligned_to_60 & (ma60s > ma120s)
+
+    touches_ma5 = lows <= ma5s
+    touches_ma10 = lows <= ma10s
+
+    # Running count of single-price bars (open == high == low == close), the
+    # pattern a trading halt leaves behind
+    halt_bars = np.concatenate(([0], np.cumsum(
+        (opens == closes) & (opens == highs) & (opens == lows))))
+
+    # Number of rows dated on or before each row's date. Rows are in date order,
+    # so the rows dated in (a, b] number rows_through_date[b] - rows_through_date[a],
+    # with same-date rows handled the same way as a date-range filter.
+    date_values = df['일자'].to_numpy()
+    rows_through_date = np.searchsorted(date_values, date_values, side='right')
+
+    # After a trade no new trigger is taken until a close below MA20 is seen
+    closes_below_ma20 = np.concatenate(([0], np.cumsum(closes < ma20s)))
+
+    for idx in np.flatnonzero(trigger):
         if waiting_for_ma20_dip:
-            if row['종가'] < row['MA_20']:
+            if closes_below_ma20[idx + 1] > closes_below_ma20[waiting_since + 1]:
                 waiting_for_ma20_dip = False
             else:
                 continue
 
-        if (
-                (min_rate is None or row['등락률'] > min_rate) and
-                (max_rate is None or row['등락률'] < max_rate) and
-                (min_volume is None or row['거래대금'] > min_volume) and
-                (max_volume is None or row['거래대금'] < max_volume) and
-                (min_foreign is None or row.get('외국인_순매수', 0) > min_foreign) and
-                (min_institution is None or row.get('기관_순매수', 0) > min_institution) and
-                df.loc[idx - 1, '등락률'] > -10 and
-                row['종가'] >= row['MA_5'] * 1.05
-        ):
-            # 🚫 Reject trigger if MA20 is more than 4% above MA10
-            ma10 = row['MA_10']
-            ma20 = row['MA_20']
-            if (ma20 - ma10) / ma10 * 100 > 4:
-                continue
+        trigger_date = dates[idx]
 
-            # 🚫 Reject trigger if MA10 is more than 5% above MA5
-            ma5 = row['MA_5']
-            if (ma10 - ma5) / ma5 * 100 > 5:
-                continue
+        # === Trigger intra-day max % until MA5 touched ===
+        trigger_prev_close = prev_close[idx]
+        # Highs from the trigger day through the first later day whose low touches
+        # MA5 (or through the last row when MA5 is never touched)
+        after = touches_ma5[idx + 1:]
+        stop = idx + 1 + after.argmax() if after.any() else len(df) - 1
+        trigger_max_high = highs[idx:stop + 1].max()
+        trigger_intra_high_pct = round((trigger_max_high - trigger_prev_close) / trigger_prev_close * 100, 2)
 
-            # 🚫 Skip if previous day's open was a severe gap-down (>10%)
-            prev_row = df.loc[idx - 1]
-            gap_down_pct = (row['시가'] - prev_row['종가']) / prev_row['종가'] * 100
-            if gap_down_pct < -10:
-                continue
+        # === Entry Logic (Updated MA5 Cross-Down Rule) ===
+        entry_idx, entry_price = _scan_entry(idx + 1, lows, highs, opens, closes, ma5s, ma10s, ma20s)
+        if entry_idx < 0:
+            continue
 
-            # ✅ New flat-day filter: no 5+ consecutive flat days in past 20
-            past_20 = df.loc[max(0, idx - 20): idx - 1, '등락률']
-            consecutive_flats = 0
-            has_3_or_more_consecutive_zeros = False
-
-            for r in past_20:
-                if r == 0:
-                    consecutive_flats += 1
-                    if consecutive_flats >= 3:
-                        has_3_or_more_consecutive_zeros = True
-                        break
-                else:
-                    consecutive_flats = 0
-
-            if has_3_or_more_consecutive_zeros:
-                continue
+        entry_date = dates[entry_idx]
+        #entry_price = entry_row['MA_5']
+        # ✅ Calculate trading-day gap between trigger and entry (excluding trigger day itself)
+        days_took_to_entry = rows_through_date[entry_idx] - rows_through_date[idx]
 
-            trigger_date = row['일자']
-            trigger_row = row
-
-            # === Trigger intra-day max % until MA5 touched ===
-            trigger_prev_close = df.loc[idx - 1, '종가']
-            trigger_max_high = row['고가']
-            for i in range(idx + 1, len(df)):
-                row_i = df.loc[i]
-                trigger_max_high = max(trigger_max_high, row_i['고가'])
-                if row_i['저가'] <= row_i['MA_5']:
-                    break
-            trigger_intra_high_pct = round((trigger_max_high - trigger_prev_close) / trigger_prev_close * 100, 2)
-
-            # === Entry Logic (Updated MA5 Cross-Down Rule) ===
-            entry_idx = None
-            entry_price = None
-
-            for forward_idx in range(idx + 1, len(df)):
-                row_forward = df.loc[forward_idx]
-                ma5 = row_forward['MA_5']
-                ma10 = row_forward['MA_10']
-                ma20 = row_forward['MA_20']
-                low = row_forward['저가']
-                high = row_forward['고가']
-                open_price = row_forward['시가']
-                close_price = row_forward['종가']
-
-                # 🚩 Condition 1: any of the four prices dips below MA5
-                prices = [low, high, open_price, close_price]
-                crossed_down_ma5 = any(p < ma5 for p in prices)
-
-                if crossed_down_ma5:
-                    if open_price < ma10:
-                        entry_price = None
-                        break
-
-                    # ✅ Improved logic: separate gap-down vs overlap cases
-                    if open_price < ma5:
-                        # Gap-down under MA5, but above MA10 → enter at open
-                        entry_price = open_price
-                    elif low <= ma5 <= high:
-                        # Ideal overlap → enter at MA5
-                        entry_price = ma5
-                    else:
-                        # Fallback → enter at open
-                        entry_price = open_price
-
-                    # 🚩 Optional filters
-                    spread = (ma5 - ma10) / ma10 * 100
-                    if spread < 3:
-                        entry_price = None
-                        break
-
-                    if not is_valid_entry(row_forward):
-                        entry_price = None
-                        break
-
-                    entry_idx = forward_idx
-                    break
-
-            if entry_idx is None or entry_price is None:
-                continue
+        # ✅ Calculate pre-entry peak return (%)
+        trigger_idx = idx  # The index where the trigger was found
+        peak_high = highs[trigger_idx:entry_idx + 1].max()
+        pre_entry_peak_return_pct = round((peak_high - entry_price) / entry_price * 100, 2)
 
-            entry_row = df.loc[entry_idx]
-            entry_date = entry_row['일자']
-            #entry_price = entry_row['MA_5']
-            # ✅ Calculate trading-day gap between trigger and entry (excluding trigger day itself)
-            days_took_to_entry = df.loc[(df['일자'] > trigger_date) & (df['일자'] <= entry_date)].shape[0]
+        # === Spreads & 정배열 체크 === (_scan_entry already required MA5 > MA10 > MA20)
+        정배열_5_10_20_60 = aligned_to_60[entry_idx]
+        정배열_5_10_20_60_120 = aligned_to_120[entry_idx]
+        spread_ma5_10 = round(spreads_ma5_10[entry_idx], 2)
+        spread_ma5_20 = round(spreads_ma5_20[entry_idx], 2)
 
-            # ✅ Calculate pre-entry peak return (%)
-            trigger_idx = idx  # The index where the trigger was found
-            peak_high = df.loc[trigger_idx:entry_idx, '고가'].max()
-            pre_entry_peak_return_pct = round((peak_high - entry_price) / entry_price * 100, 2)
 
-            if not is_valid_entry(entry_row):
-                continue
 
-            # === Spreads & 정배열 체크 ===
-            정배열_5_10_20_60 = (
-                entry_row['MA_5'] > entry_row['MA_10'] > entry_row['MA_20'] > entry_row['MA_60']
-            )
-            정배열_5_10_20_60_120 = (
-                entry_row['MA_5'] > entry_row['MA_10'] > entry_row['MA_20'] > entry_row['MA_60'] > entry_row['MA_120']
-            )
-            spread_ma5_10 = round((entry_row['MA_5'] - entry_row['MA_10']) / entry_row['MA_10'] * 100, 2)
-            spread_ma5_20 = round((entry_row['MA_5'] - entry_row['MA_20']) / entry_row['MA_20'] * 100, 2)
-
-
-
-            # === Exit Logic ===
-            ma10_entry = entry_row['MA_10']
-            target_price = calculate_target_price(entry_price, entry_row['MA_5'], ma10_entry)
-            exit_price = None
-            exit_date = None
-            outcome = None
-            note = ""
-            max_drawdown = 0
-
-            for exit_idx in range(entry_idx, len(df)):
-                row_exit = df.loc[exit_idx]
-                high = row_exit['고가']
-                low = row_exit['저가']
-                ma10 = row_exit['MA_10']
-
-                open_price = row_exit['시가']
-                opened_below_ma10 = open_price < ma10
-
-                drawdown = (low - entry_price) / entry_price * 100
-                max_drawdown = min(max_drawdown, drawdown)
-
-                hit_target = high >= target_price
-                hit_ma10 = low <= ma10 or opened_below_ma10
-
-                # 🚫 NEW RULE: skip same-day target-only exits (only allow same-day loss)
-                if hit_target and hit_ma10:
-                    # Conservative exit: MA10 hit wins over target
-                    if opened_below_ma10:
-                        exit_price = open_price
-                        note = "both hit — gap-down below MA10 → exited at open (loss)"
-                    else:
-                        exit_price = ma10
-                        note = "both hit — MA10 breached intraday → exited at MA10 (loss)"
-                    exit_date = row_exit['일자']
-                    outcome = 'loss'
-                    break
-
-                # ✅ Insert this check here to disallow same-day profit-only exits
-                if exit_idx == entry_idx and hit_target and not hit_ma10:
-                    continue  # Skip — don't count same-day wins
-
-                elif hit_target:
-                    exit_price = target_price
-                    exit_date = row_exit['일자']
-                    outcome = 'win'
-                    note = "target hit first"
-                    break
-                elif hit_ma10:
-                    if opened_below_ma10:
-                        exit_price = open_price
-                        note = "gap-down below MA10 → exited at open"
-                    else:
-                        exit_price = ma10
-                        note = "intraday MA10 breach → exited at MA10"
-                    exit_date = row_exit['일자']
-                    outcome = 'loss'
-                    break
-
-            if exit_price is None:
-                continue
+        # === Exit Logic ===
+        target_price = calculate_target_price(entry_price, ma5s[entry_idx], ma10s[entry_idx])
 
-            # === Max gain until MA10 touch (excluding entry day) ===
-            max_high_until_ma10 = None
-
-            # ❗ Fix: skip gain calculation if trade exited same day
-            if exit_date != entry_date:
-                for i in range(entry_idx + 1, len(df)):
-                    row_i = df.loc[i]
-                    open_price = row_i['시가']
-                    low_price = row_i['저가']
-                    ma10 = row_i['MA_10']
-
-                    # 🚫 Stop before processing this row if MA10 is touched intraday
-                    if low_price <= ma10:
-                        break
-
-                    # ✅ Only include day's high if opened at/above MA10
-                    if open_price >= ma10:
-                        high_price = row_i['고가']
-                        if max_high_until_ma10 is None:
-                            max_high_until_ma10 = high_price
-                        else:
-                            max_high_until_ma10 = max(max_high_until_ma10, high_price)
-
-            if max_high_until_ma10 is not None:
-                custom_max_gain_pct = round((max_high_until_ma10 - entry_price) / entry_price * 100, 2)
-            else:
-                custom_max_gain_pct = 0.0
-
-            days_held = df[(df['일자'] > entry_date) & (df['일자'] <= exit_date)].shape[0]
-            # Check for suspected trading halts
-            halt_suspect_rows = df.loc[entry_idx + 1: exit_idx]
-            flat_rows = halt_suspect_rows[
-                (halt_suspect_rows['시가'] == halt_suspect_rows['종가']) &
-                (halt_suspect_rows['시가'] == halt_suspect_rows['고가']) &
-                (halt_suspect_rows['시가'] == halt_suspect_rows['저가'])
-                ]
-
-            if flat_rows.shape[0] > 1:
-                note += " | 거래정지의심"
-
-            slope_ma5 = calculate_slope(df.loc[:entry_idx]['MA_5'].values)
-            slope_ma10 = calculate_slope(df.loc[:entry_idx]['MA_10'].values)
-            slope_ma20 = calculate_slope(df.loc[:entry_idx]['MA_20'].values)
-
-            return_pct = calculate_return(entry_price, exit_price)
-            risk_to_reward = round(return_pct / spread_ma5_10, 4) if spread_ma5_10 else None
-
-
-            results.append({
-                '종목코드': stock_code,
-                '종목명': stock_name,
-                '테마명': df.get('manual_theme', [None])[0] if 'manual_theme' in df.columns else None,
-                'trigger_date': trigger_date,
-                'entry_date': entry_date,
-                'exit_date': exit_date,
-                'entry_price': entry_price,
-                'exit_price': exit_price,
-                'return_pct': return_pct,
-                'days_held': days_held,
-                'target_price': target_price,
-                'outcome': outcome,
-                'note': note,
-                'max_gain_pct': custom_max_gain_pct,
-                'max_drawdown': round(max_drawdown, 2),
-                'spread_ma5_10': spread_ma5_10,
-                'spread_ma5_20': spread_ma5_20,
-                '정배열_5_10_20_60': 정배열_5_10_20_60,
-                '정배열_5_10_20_60_120': 정배열_5_10_20_60_120,
-                'trigger_intra_high_pct': trigger_intra_high_pct,
-                'slope_ma5': slope_ma5,
-                'slope_ma10': slope_ma10,
-                'slope_ma20': slope_ma20,
-                '외국인_순매수': trigger_row.get('외국인_순매수', None),
-                '기관_순매수': trigger_row.get('기관_순매수', None),
-                'entry_id': f"{stock_code}_EN{len(results)+1}",
-                'exit_id': f"{stock_code}_EX{len(results)+1}",
-                'trigger_rate_used': min_rate,
-                'trigger_volume_used': min_volume,
-                'trigger_foreign_used': min_foreign,
-                'trigger_institution_used': min_institution,
-                'risk_to_reward': risk_to_reward,
-                'pre_entry_peak_return_pct': pre_entry_peak_return_pct,
-                'Days_took_to_Entry': days_took_to_entry,
-
-            })
-
-            waiting_for_ma20_dip = True
-            last_exit_idx = exit_idx
+        exit_idx, exit_price, exit_code, max_drawdown = _scan_exit(
+            entry_idx, entry_price, target_price, lows, highs, opens, ma10s)
+        if exit_idx < 0:
+            continue
+
+        exit_date = dates[exit_idx]
+        outcome = EXIT_OUTCOMES[exit_code]
+        note = EXIT_NOTES[exit_code]
+
+        # === Max gain until MA10 touch (excluding entry day) ===
+        max_high_until_ma10 = None
+
+        # ❗ Fix: skip gain calculation if trade exited same day
+        if exit_date != entry_date:
+            # Days after entry up to (not including) the first intraday MA10 touch;
+            # only days that opened at/above MA10 count toward the high
+            after = touches_ma10[entry_idx + 1:]
+            stop = entry_idx + 1 + after.argmax() if after.any() else len(df)
+            opened_above = opens[entry_idx + 1:stop] >= ma10s[entry_idx + 1:stop]
+            if opened_above.any():
+                max_high_until_ma10 = highs[entry_idx + 1:stop][opened_above].max()
+
+        if max_high_until_ma10 is not None:
+            custom_max_gain_pct = round((max_high_until_ma10 - entry_price) / entry_price * 100, 2)
+        else:
+            custom_max_gain_pct = 0.0
+
+        days_held = rows_through_date[exit_idx] - rows_through_date[entry_idx]
+        # Check for suspected trading halts (flat bars after entry, through exit)
+        if halt_bars[exit_idx + 1] - halt_bars[entry_idx + 1] > 1:
+            note += " | 거래정지의심"
+
+        slope_ma5 = slope5[entry_idx]
+        slope_ma10 = slope10[entry_idx]
+        slope_ma20 = slope20[entry_idx]
+
+        return_pct = calculate_return(entry_price, exit_price)
+        risk_to_reward = round(return_pct / spread_ma5_10, 4) if spread_ma5_10 else None
+
+
+        # One tuple per trade, in RESULT_COLUMNS order
+        results.append((
+            stock_code,
+            stock_name,
+            theme,
+            trigger_date,
+            entry_date,
+            exit_date,
+            entry_price,
+            exit_price,
+            return_pct,
+            days_held,
+            target_price,
+            outcome,
+            note,
+            custom_max_gain_pct,
+            round(max_drawdown, 2),
+            spread_ma5_10,
+            spread_ma5_20,
+            정배열_5_10_20_60,
+            정배열_5_10_20_60_120,
+            trigger_intra_high_pct,
+            slope_ma5,
+            slope_ma10,
+            slope_ma20,
+            foreign[idx] if has_foreign else None,
+            institution[idx] if has_institution else None,
+            f"{stock_code}_EN{len(results)+1}",
+            f"{stock_code}_EX{len(results)+1}",
+            min_rate,
+            min_volume,
+            min_foreign,
+            min_institution,
+            risk_to_reward,
+            pre_entry_peak_return_pct,
+            days_took_to_entry,
+        ))
+
+        waiting_for_ma20_dip = True
+        waiting_since = idx
+        last_exit_idx = exit_idx
 
     return results
 
+def calculate_held_counts(df_results: pd.DataFrame) -> pd.Series:
+    """Number of stocks held on each calendar day, entry and exit days included."""
+    entry_dates = pd.to_datetime(df_results['entry_date'])
+    exit_dates = pd.to_datetime(df_results['exit_date'])
+    all_dates = pd.date_range(entry_dates.min(), exit_dates.max())
+
+    # Sweep line: +1 on the entry day, -1 on the day after the exit
+    first_day = all_dates[0].to_datetime64()
+    start = (entry_dates.values - first_day).astype('timedelta64[D]').astype(np.int64)
+    end = (exit_dates.values - first_day).astype('timedelta64[D]').astype(np.int64) + 1
+    n_days = len(all_dates)
+    delta = np.bincount(start, minlength=n_days + 1) - np.bincount(end, minlength=n_days + 1)
+    return pd.Series(np.cumsum(delta)[:n_days], index=all_dates)
+
+
 def generate_daily_summary(df_results: pd.DataFrame) -> pd.DataFrame:
     df = df_results.copy()
     df['entry_date'] = pd.to_datetime(df['entry_date'])
     df['exit_date'] = pd.to_datetime(df['exit_date'])
 
     # --- Simulate daily stock holdings ---
-    all_dates = pd.date_range(df['entry_date'].min(), df['exit_date'].max())
-    held_counts = pd.Series(0, index=all_dates)
-
-    for _, row in df.iterrows():
-        held_range = pd.date_range(row['entry_date'], row['exit_date'])
-        held_counts.loc[held_range] += 1
+    held_counts = calculate_held_counts(df)
 
     max_held_stocks = held_counts.max()
 
     # --- Group by entry date ---
     grouped = df.groupby('entry_date')
-    summary = pd.DataFrame({
-        'return_pct (sum)': grouped['return_pct'].sum(),
-        '# of Trades (sum)': grouped.size(),
-        'max_gain_pct (average)': grouped['max_gain_pct'].mean(),
-        'max_drawdown (average)': grouped['max_drawdown'].mean(),
-        'spread_ma5_10 (average)': grouped['spread_ma5_10'].mean(),
-        'risk_to_reward (sum)': grouped['risk_to_reward'].sum(),
-        'risk_to_reward (average)': grouped['risk_to_reward'].mean(),
-        '# of stocks bought (sum)': grouped.size(),
+    summary = grouped.agg(**{
+        'return_pct (sum)': ('return_pct', 'sum'),
+        '# of Trades (sum)': ('return_pct', 'size'),
+        'max_gain_pct (average)': ('max_gain_pct', 'mean'),
+        'max_drawdown (average)': ('max_drawdown', 'mean'),
+        'spread_ma5_10 (average)': ('spread_ma5_10', 'mean'),
+        'risk_to_reward (sum)': ('risk_to_reward', 'sum'),
+        'risk_to_reward (average)': ('risk_to_reward', 'mean'),
     })
+    summary['# of stocks bought (sum)'] = summary['# of Trades (sum)']
 
     # --- Count sells on each exit date ---
     exit_counts = df['exit_date'].value_counts().rename('# of stocks sold (sum)')
@@ -448,8 +480,8 @@ def generate_monthly_summary(df_results: pd.DataFrame) -> pd.DataFrame:
     trade_counts = grouped.size()
 
     # Win/Loss counts
-    win_counts = grouped.apply(lambda g: (g['return_pct'] > 0).sum())
-    lose_counts = grouped.apply(lambda g: (g['return_pct'] <= 0).sum())
+    win_counts = (df['return_pct'] > 0).astype(np.int64).groupby(df['month']).sum()
+    lose_counts = (df['return_pct'] <= 0).astype(np.int64).groupby(df['month']).sum()
     win_ratios = (win_counts / trade_counts).round(2)
 
     # Build table
@@ -484,8 +516,8 @@ def generate_weekly_summary(df_results: pd.DataFrame) -> pd.DataFrame:
 
     # Compute each metric
     return_sum = grouped['return_pct'].sum()
-    win_counts = grouped.apply(lambda g: (g['return_pct'] > 0).sum())
-    lose_counts = grouped.apply(lambda g: (g['return_pct'] <= 0).sum())
+    win_counts = (df['return_pct'] > 0).astype(np.int64).groupby(df['week']).sum()
+    lose_counts = (df['return_pct'] <= 0).astype(np.int64).groupby(df['week']).sum()
     total_counts = grouped.size()
     win_ratios = (win_counts / total_counts).round(2)
 
@@ -501,27 +533,24 @@ def generate_weekly_summary(df_results: pd.DataFrame) -> pd.DataFrame:
     return summary
 
 
+def _max_runs(vals: np.ndarray) -> tuple:
+    """Longest run of positive and of negative values, found in one pass."""
+    if vals.size == 0:
+        return 0, 0
+    sign = np.sign(vals)
+    # Run boundaries are wherever the sign changes (NaN never equals itself)
+    bounds = np.flatnonzero(np.r_[True, sign[1:] != sign[:-1], True])
+    lengths = np.diff(bounds)
+    run_sign = sign[bounds[:-1]]
+    return int(lengths[run_sign > 0].max(initial=0)), int(lengths[run_sign < 0].max(initial=0))
+
+
 def calculate_max_streaks(df: pd.DataFrame) -> tuple:
     df = df.copy()
     df['entry_date'] = pd.to_datetime(df['entry_date'])
     daily_returns = df.groupby('entry_date')['return_pct'].sum().sort_index()
 
-    win_streak = max_streak = 0
-    max_win = 0
-    for val in daily_returns:
-        if val > 0:
-            win_streak += 1
-            max_win = max(max_win, win_streak)
-        else:
-            win_streak = 0
-
-    loss_streak = max_loss = 0
-    for val in daily_returns:
-        if val < 0:
-            loss_streak += 1
-            max_loss = max(max_loss, loss_streak)
-        else:
-            loss_streak = 0
+    max_win, max_loss = _max_runs(daily_returns.to_numpy())
 
     return max_win, max_loss
 
@@ -530,34 +559,48 @@ def calculate_max_streaks(df: pd.DataFrame) -> tuple:
 # Batch Runner
 # -----------------------------
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("parquet_path", help="Path to enhanced .parquet file")
-    parser.add_argument("strategy_id", help="Strategy ID for output folder naming")
-    parser.add_argument("min_rate", nargs="?", default=TRIGGER_RATE)
-    parser.add_argument("max_rate", nargs="?", default=None)
-    parser.add_argument("min_volume", nargs="?", default=TRIGGER_VOLUME)
-    parser.add_argument("max_volume", nargs="?", default=None)
-    parser.add_argument("min_foreign", nargs="?", default=TRIGGER_FOREIGN)
-    parser.add_argument("min_institution", nargs="?", default=TRIGGER_INSTITUTION)
-    parser.add_argument("--manual-trigger", help="Path to Excel file containing manually defined triggers")
+def _run_one(job):
+    """Backtest one stock; a module-level function so worker processes can pickle it."""
+    group_df, code, name, params = job
+    return run_backtest(group_df, code, name, *params, assume_sorted=True)
 
-    args = parser.parse_args()
 
-    input_path = args.parquet_path
-    strategy_id = args.strategy_id
+def _run_all(jobs, workers=None):
+    """Yield each job's results in job order, using worker processes unless workers == 1."""
+    if workers == 1:
+        yield from map(_run_one, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_run_one, jobs, chunksize=8)
+
+
+def run(parquet_path, strategy_id,
+        min_rate=TRIGGER_RATE, max_rate=None,
+        min_volume=TRIGGER_VOLUME, max_volume=None,
+        min_foreign=TRIGGER_FOREIGN, min_institution=TRIGGER_INSTITUTION,
+        manual_trigger=None, workers=None, results_parquet=False, log=print):
+    """
+    Run the MA5 backtest on an enhanced parquet and write the results workbook.
+
+    Parameters may be given as strings ("" disables a filter), as the GUI passes
+    them. Progress lines go to ``log``, so a caller in the same process (the
+    backtest view) can stream them. Returns the workbook path on completion,
+    None when the run stopped early.
+    """
+    input_path = parquet_path
 
     # ✅ Create output folder using strategy_id
     OUTPUT_DIR = f'Test_Results/{strategy_id}'
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    print(f"▶ Loading data from: {input_path}")
-    if args.manual_trigger:
-        print(f"▶ Manual trigger mode activated: {args.manual_trigger}")
+    log(f"▶ Loading data from: {input_path}")
+    if manual_trigger:
+        log(f"▶ Manual trigger mode activated: {manual_trigger}")
     else:
-        print(f"▶ Parameters: 등락률 ≥ {args.min_rate}, ≤ {args.max_rate}, 거래대금 ≥ {args.min_volume}, ≤ {args.max_volume}, 외국인 ≥ {args.min_foreign}, 기관 ≥ {args.min_institution}")
+        log(f"▶ Parameters: 등락률 ≥ {min_rate}, ≤ {max_rate}, 거래대금 ≥ {min_volume}, ≤ {max_volume}, 외국인 ≥ {min_foreign}, 기관 ≥ {min_institution}")
 
-    df_all = pd.read_parquet(input_path)
+    available = set(pq.read_schema(input_path).names)
+    df_all = pd.read_parquet(input_path, columns=[c for c in BACKTEST_COLUMNS if c in available])
 
 
 
@@ -568,72 +611,86 @@ def main():
         if col not in df_all.columns:
             raise ValueError(f"Missing required column: {col}")
 
+    # 종목코드/종목명 repeat on every row of a stock: as categoricals each string
+    # is stored once and the per-stock grouping works on small integer codes.
+    # Prices and MAs stay float64 — float32 shifts MA spreads and MA5 entry
+    # prices enough to change which trades are taken.
+    for col in ('종목코드', '종목명'):
+        df_all[col] = df_all[col].astype('category')
+
     all_results = []
 
-    if args.manual_trigger:
+    if manual_trigger:
 
 
-        manual_df = pd.read_excel(args.manual_trigger)
+        manual_df = pd.read_excel(manual_trigger)
         manual_df['날짜'] = pd.to_datetime(manual_df['날짜'])
         df_all['일자'] = pd.to_datetime(df_all['일자'])
 
+        # Row positions per stock name from one pass; each stock is sliced and
+        # sorted once, however many manual triggers reference it
+        rows_by_name = df_all.groupby('종목명', observed=True).indices
+        sorted_stocks = {}
+
         for _, row in manual_df.iterrows():
             stock_name = row['종목명']
             trigger_date = row['날짜']
             theme = row.get('테마명', None)
 
             # Filter stock data
-            stock_df = df_all[df_all['종목명'] == stock_name].copy()
-            if stock_df.empty:
-                print(f"⚠️ No data found for: {stock_name}")
+            if stock_name not in rows_by_name:
+                log(f"⚠️ No data found for: {stock_name}")
                 continue
+            if stock_name not in sorted_stocks:
+                sorted_stocks[stock_name] = (df_all.iloc[rows_by_name[stock_name]]
+                                             .sort_values('일자').reset_index(drop=True))
+            stock_df = sorted_stocks[stock_name]
 
-            code = stock_df['종목코드'].iloc[0]
-            stock_df = stock_df.sort_values('일자').reset_index(drop=True)
+            code = df_all['종목코드'].iat[rows_by_name[stock_name][0]]
 
             # Inject theme column
-            stock_df['manual_theme'] = theme
+            stock_df = stock_df.assign(manual_theme=theme)
             results = run_backtest(
                 stock_df, code, stock_name,
-                args.min_rate, args.max_rate,
-                args.min_volume, args.max_volume,
-                args.min_foreign, args.min_institution,
-                manual_trigger_date=trigger_date
+                min_rate, max_rate,
+                min_volume, max_volume,
+                min_foreign, min_institution,
+                manual_trigger_date=trigger_date,
+                assume_sorted=True
             )
             all_results.extend(results)
 
     else:
-        grouped = df_all.groupby(['종목코드', '종목명'])
-
-        for (code, name), group_df in grouped:
-            print(f"▶ Running backtest for {code} ({name})")
-            results = run_backtest(group_df.copy(), code, name,
-                                   args.min_rate, args.max_rate,
-                                   args.min_volume, args.max_volume,
-                                   args.min_foreign, args.min_institution)
+        # One global sort instead of one per stock; groups keep this row order
+        df_all = df_all.sort_values(['종목코드', '일자'], kind='stable')
+        grouped = df_all.groupby(['종목코드', '종목명'], observed=True)
+        params = (min_rate, max_rate,
+                  min_volume, max_volume,
+                  min_foreign, min_institution)
+
+        # Stocks are independent, so they are backtested in parallel. The key
+        # columns are dropped so workers are not sent the categories each time.
+        jobs = [(group_df.drop(columns=['종목코드', '종목명']), code, name, params)
+                for (code, name), group_df in grouped]
+        for (_, code, name, _), results in zip(jobs, _run_all(jobs, workers)):
+            log(f"▶ Backtested {code} ({name}): {len(results)} trade(s)")
             all_results.extend(results)
 
     if not all_results:
-        print("⚠️ No trades triggered.")
-        return
+        log("⚠️ No trades triggered.")
+        return None
+
+    df_results = pd.DataFrame.from_records(all_results, columns=RESULT_COLUMNS)
 
     # Remove duplicates if using manual trigger file
-    if args.manual_trigger:
-        before = len(all_results)
-        df_temp = pd.DataFrame(all_results)
-        df_temp.drop_duplicates(subset=["종목코드", "trigger_date"], inplace=True)
-        after = len(df_temp)
-        print(f"[Deduplication] Removed {before - after} duplicate entries.")
-        all_results = df_temp.to_dict(orient="records")
-
-    df_results = pd.DataFrame(all_results)
-    # Recalculate held_counts here for use in both summary and global stats
-    all_dates = pd.date_range(df_results['entry_date'].min(), df_results['exit_date'].max())
-    held_counts = pd.Series(0, index=all_dates)
+    if manual_trigger:
+        before = len(df_results)
+        df_results = df_results.drop_duplicates(subset=["종목코드", "trigger_date"]).reset_index(drop=True)
+        after = len(df_results)
+        log(f"[Deduplication] Removed {before - after} duplicate entries.")
 
-    for _, row in df_results.iterrows():
-        held_range = pd.date_range(row['entry_date'], row['exit_date'])
-        held_counts.loc[held_range] += 1
+    # Recalculate held_counts here for use in both summary and global stats
+    held_counts = calculate_held_counts(df_results)
 
     output_path = os.path.join(OUTPUT_DIR, f'{strategy_id}_results.xlsx')
 
@@ -643,8 +700,17 @@ def main():
 
     weekly_summary_df = generate_weekly_summary(df_results)
 
+    # Writing every trade cell by cell through openpyxl dominates large runs;
+    # the per-trade table can go to Parquet instead and leave only the
+    # summaries (and their charts) in the workbook
+    if results_parquet:
+        results_path = os.path.join(OUTPUT_DIR, f'{strategy_id}_results.parquet')
+        df_results.to_parquet(results_path, index=False)
+        log(f"✅ Per-trade results saved to: {results_path}")
+
     with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        df_results.to_excel(writer, index=False, sheet_name='Results')
+        if not results_parquet:
+            df_results.to_excel(writer, index=False, sheet_name='Results')
         daily_summary_df.to_excel(writer, sheet_name='Summary', startrow=0)
         monthly_summary_df.to_excel(writer, sheet_name='Summary 2', startrow=0)
         weekly_summary_df.to_excel(writer, sheet_name='Summary 3', startrow=0)
@@ -692,8 +758,8 @@ def main():
                 valid_month_cols.append(col_idx)
 
         if not valid_month_cols:
-            print("❌ No valid month columns found.")
-            return
+            log("❌ No valid month columns found.")
+            return None
 
         min_col = min(valid_month_cols)
         max_col = max(valid_month_cols)
@@ -725,7 +791,7 @@ def main():
 
             ws.add_chart(chart, f"B{cumret_row_idx + 3}")
         else:
-            print("❌ 'cumulative_return_pct' row not found.")
+            log("❌ 'cumulative_return_pct' row not found.")
 
 
 
@@ -748,7 +814,7 @@ def main():
 
             ws.add_chart(chart2, f"B{winratio_row_idx + 20}")
         else:
-            print("❌ 'Win Ratio (Win/Total # Trade)' row not found.")
+            log("❌ 'Win Ratio (Win/Total # Trade)' row not found.")
 
         # Calculate global stats
         max_win, max_loss = calculate_max_streaks(df_results)
@@ -767,10 +833,36 @@ def main():
         worksheet.cell(row=start_row + 2, column=1, value="Max number of stocks held at the same time")
         worksheet.cell(row=start_row + 2, column=2, value=int(max_held_stocks))
 
-    print(f"✅ Backtest completed. Results saved to: {output_path}")
+    log(f"✅ Backtest completed. Results saved to: {output_path}")
+    return output_path
 
 
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("parquet_path", help="Path to enhanced .parquet file")
+    parser.add_argument("strategy_id", help="Strategy ID for output folder naming")
+    parser.add_argument("min_rate", nargs="?", default=TRIGGER_RATE)
+    parser.add_argument("max_rate", nargs="?", default=None)
+    parser.add_argument("min_volume", nargs="?", default=TRIGGER_VOLUME)
+    parser.add_argument("max_volume", nargs="?", default=None)
+    parser.add_argument("min_foreign", nargs="?", default=TRIGGER_FOREIGN)
+    parser.add_argument("min_institution", nargs="?", default=TRIGGER_INSTITUTION)
+    parser.add_argument("--manual-trigger", help="Path to Excel file containing manually defined triggers")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for the per-stock backtests (default: CPU count, 1 = no pool)")
+    parser.add_argument("--results-parquet", action="store_true",
+                        help="Save the per-trade results to a .parquet file instead of the workbook's Results sheet")
 
+    args = parser.parse_args()
+    run(
+        args.parquet_path, args.strategy_id,
+        args.min_rate, args.max_rate,
+        args.min_volume, args.max_volume,
+        args.min_foreign, args.min_institution,
+        manual_trigger=args.manual_trigger,
+        workers=args.workers,
+        results_parquet=args.results_parquet,
+    )
 
 
 if __name__ == '__main__':
@@ -1,71 +1,124 @@
 import os
-import requests
 import json
-import pandas as pd
-from time import sleep
+import threading
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from time import monotonic, sleep
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
+from core.http_session import get_session
 
-def download_daily_candlestick_data(symbols, start_date, end_date, save_dir, logger=print):
-    """
-    Downloads daily candlestick chart data for a list of stock codes from Naver and saves them as Parquet files.
-    """
+# orjson parses the chart payload several times faster; fall back when it is not installed
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+# Naver is fetched by a few threads at once, so one slow response does not stall
+# the rest; the request rate itself stays capped by _naver_throttle
+MAX_CONCURRENT_REQUESTS = 4
+
+# 과도한 요청 방지: at most one request starts per this many seconds, across all threads
+MIN_REQUEST_INTERVAL = 1.0
+
+
+class _Throttle:
+    """Spaces calls to wait() at least `interval` seconds apart, across threads."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        # Reserve the next slot under the lock, then sleep outside it
+        with self._lock:
+            now = monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            sleep(start - now)
+
+
+_naver_throttle = _Throttle(MIN_REQUEST_INTERVAL)
+
+
+def _fetch_and_save(session, code, start_date, end_date, save_dir):
+    """Download one symbol and write it as parquet. Returns (filename, row count)."""
     base_url = "https://m.stock.naver.com/front-api/external/chart/domestic/info"
     headers = {
         "Referer": "https://m.stock.naver.com/",
         "User-Agent": "Mozilla/5.0"
     }
+    params = {
+        "symbol": code,
+        "requestType": "1",
+        "startTime": start_date,
+        "endTime": end_date,
+        "timeframe": "day"
+    }
 
-    os.makedirs(save_dir, exist_ok=True)
-
-    for code in symbols:
-        try:
-            logger(f"🔍 다운로드 시작: {code} / {start_date} ~ {end_date}")
-
-            params = {
-                "symbol": code,
-                "requestType": "1",
-                "startTime": start_date,
-                "endTime": end_date,
-                "timeframe": "day"
-            }
+    _naver_throttle.wait()
+    response = session.get(base_url, params=params, headers=headers, timeout=10)
 
-            response = requests.get(base_url, params=params, headers=headers, timeout=10)
+    if response.status_code != 200:
+        raise Exception(f"HTTP 오류: {response.status_code}")
 
-            if response.status_code != 200:
-                raise Exception(f"HTTP 오류: {response.status_code}")
+    text = response.text.strip()
 
-            text = response.text.strip()
+    if not text.startswith("[[") or not text.endswith("]"):
+        raise ValueError("❌ 응답 형식이 올바르지 않습니다.")
 
-            if not text.startswith("[[") or not text.endswith("]"):
-                raise ValueError("❌ 응답 형식이 올바르지 않습니다.")
+    try:
+        # Naver quotes the header row with ' — only rewrite quotes when present
+        json_text = text.replace("'", '"') if "'" in text else text
+        cleaned = _json_loads(json_text)
+    except Exception as parse_error:
+        raise ValueError(f"❌ JSON 파싱 실패: {parse_error}")
 
-            try:
-                json_text = text.replace("'", '"')
-                cleaned = json.loads(json_text)
-            except Exception as parse_error:
-                raise ValueError(f"❌ JSON 파싱 실패: {parse_error}")
+    if not isinstance(cleaned, list) or len(cleaned) < 2:
+        raise ValueError("❌ 유효한 데이터가 없습니다.")
 
-            if not isinstance(cleaned, list) or len(cleaned) < 2:
-                raise ValueError("❌ 유효한 데이터가 없습니다.")
+    columns = cleaned[0]
+    rows = cleaned[1:]
 
-            columns = cleaned[0]
-            rows = cleaned[1:]
+    # Build the Arrow table column by column; no intermediate DataFrame
+    table = pa.table({name: list(values) for name, values in zip(columns, zip(*rows))})
 
-            df = pd.DataFrame(rows, columns=columns)
+    # 날짜를 datetime 형식으로 변환
+    idx = table.schema.get_field_index("날짜")
+    dates = pc.strptime(pc.cast(table["날짜"], pa.string()), format="%Y%m%d", unit="us")
+    table = table.set_column(idx, "날짜", dates).sort_by("날짜")
 
-            # 날짜를 datetime 형식으로 변환
-            df["날짜"] = pd.to_datetime(df["날짜"], format="%Y%m%d")
-            df.sort_values("날짜", inplace=True)
+    # 저장 경로
+    filename = f"{code}_{start_date}_{end_date}.parquet"
+    full_path = os.path.join(save_dir, filename)
+    pq.write_table(table, full_path, compression="snappy")
 
-            # 저장 경로
-            filename = f"{code}_{start_date}_{end_date}.parquet"
-            full_path = os.path.join(save_dir, filename)
-            df.to_parquet(full_path, index=False)
+    return filename, table.num_rows
 
-            logger(f"✅ 저장 완료: {filename} (행 수: {len(df)})")
 
-            sleep(1)  # 과도한 요청 방지
+def download_daily_candlestick_data(symbols, start_date, end_date, save_dir, logger=print):
+    """
+    Downloads daily candlestick chart data for a list of stock codes from Naver and saves them as Parquet files.
 
-        except Exception as e:
-            logger(f"❌ {code} 다운로드 실패: {e}")
+    Requests run on a small thread pool over the shared pooled session; results are
+    logged from the calling thread, in symbol order, so GUI loggers stay safe.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    logger(f"🔍 다운로드 시작: {len(symbols)}개 종목 / {start_date} ~ {end_date}")
+
+    session = get_session()
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+        futures = [
+            (code, pool.submit(_fetch_and_save, session, code, start_date, end_date, save_dir))
+            for code in symbols
+        ]
+        for code, future in futures:
+            try:
+                filename, n_rows = future.result()
+                logger(f"✅ 저장 완료: {filename} (행 수: {n_rows})")
+            except Exception as e:
+                logger(f"❌ {code} 다운로드 실패: {e}")
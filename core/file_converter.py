@@ -1,9 +1,56 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pandas as pd
+from openpyxl import load_workbook
 
 
 
 
+def read_xlsx_fast(path, sheet=0) -> pd.DataFrame:
+    """
+    Read one worksheet into a DataFrame using openpyxl's streaming read-only mode.
+    The first row is the header; fully empty rows are dropped like read_excel does.
+    Cell values are kept as stored, so text codes such as '005930' stay strings.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        ws.reset_dimensions()  # KRX files can carry a stale <dimension> tag
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [f"Unnamed: {i}" if c is None else c for i, c in enumerate(header)]
+        records = [row for row in rows if any(v is not None for v in row)]
+    finally:
+        wb.close()
+    return pd.DataFrame.from_records(records, columns=columns)
+
+
+def clean_columns(cols) -> list:
+    """Strip whitespace and non-breaking spaces that KRX leaves in header names."""
+    return [str(c).strip().replace('\xa0', '') for c in cols]
+
+
+def read_krx_csv(source) -> pd.DataFrame:
+    """
+    Parse a KRX CSV download (EUC-KR) from a path or the raw response bytes.
+    종목코드 is read as text so leading zeros survive.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return pd.read_csv(source, encoding="euc-kr", dtype={"종목코드": str})
+
+
+def read_krx_file(path) -> pd.DataFrame:
+    """Read a KRX download saved either as .csv or as a legacy .xlsx."""
+    if Path(path).suffix.lower() == ".csv":
+        return read_krx_csv(path)
+    return read_xlsx_fast(path)
+
+
 def ensure_folder_exists(path: Path):
     if not path.exists():
         path.mkdir(parents=True, exist_ok=True)
@@ -13,7 +60,12 @@ def ensure_folder_exists(path: Path):
 import pandas as pd
 from pathlib import Path
 
-def convert_excel_to_parquet(file_path: Path):
+def convert_excel_to_parquet(file_path: Path) -> tuple[str, str]:
+    """
+    Convert one KRX download to .parquet in the sibling _Parquet tree.
+    Never raises; returns (status, message) with status "converted", "skipped"
+    or "failed", and prints the same message.
+    """
     try:
         # Locate top-level folder (e.g., Perm_Data or 외국인_순매수_Data)
         # Step 1: find the first parent folder that ends with _Data or is named Perm_Data
@@ -22,8 +74,9 @@ def convert_excel_to_parquet(file_path: Path):
                 root_data_folder = ancestor
                 break
         else:
-            print(f"[SKIP] Couldn't find root _Data folder for {file_path}")
-            return
+            message = f"Couldn't find root _Data folder for {file_path}"
+            print(f"[SKIP] {message}")
+            return "skipped", message
 
         relative_path = file_path.relative_to(root_data_folder)
 
@@ -33,43 +86,75 @@ def convert_excel_to_parquet(file_path: Path):
 
         # Skip if already converted
         if parquet_path.exists():
-            print(f"[SKIP] Already converted: {file_path.name}")
-            return
+            message = f"Already converted: {file_path.name}"
+            print(f"[SKIP] {message}")
+            return "skipped", message
 
         # Ensure destination subfolder exists
         parquet_path.parent.mkdir(parents=True, exist_ok=True)
 
         # Convert and save
-        df = pd.read_excel(file_path, engine="openpyxl")
+        df = read_krx_file(file_path)
         df.to_parquet(parquet_path, index=False)
 
         print(f"[OK] Converted: {file_path} → {parquet_path}")
+        return "converted", f"Converted: {file_path.name}"
 
     except Exception as e:
-        print(f"[❌ FAILED] {file_path.name} → Parquet conversion error: {e}")
+        message = f"{file_path.name} → Parquet conversion error: {e}"
+        print(f"[❌ FAILED] {message}")
+        return "failed", message
 
 
 
 
 
 
-def sweep_and_convert_all(base_dir: Path):
+def _walk_source_files(base_dir: Path):
     """
-    Recursively scans for all .xlsx files under _Data and Perm_Data folders,
-    creates sibling _Parquet folders, and converts each .xlsx to .parquet (if not already exists).
+    Yield every .csv/.xlsx directly inside a _Data folder or anywhere under Perm_Data.
+    One os.scandir pass: DirEntry carries the file type, so no extra stat per entry.
     """
-    print("[INFO] Starting full sweep for Excel → Parquet conversion...")
+    stack = [str(base_dir)]
+    while stack:
+        current = stack.pop()
+        collect = current != str(base_dir) and (
+            "_Data" in os.path.basename(current) or "Perm_Data" in current
+        )
+        with os.scandir(current) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif collect and not entry.name.startswith("~") and \
+                        entry.name.lower().endswith((".csv", ".xlsx")):
+                    yield Path(entry.path)
+
+
+def sweep_and_convert_all(base_dir: Path, workers: int | None = None):
+    """
+    Recursively scans for all .csv/.xlsx files under _Data and Perm_Data folders,
+    creates sibling _Parquet folders, and converts each file to .parquet (if not already exists).
+
+    Files are converted in a process pool (``workers`` defaults to the CPU count),
+    since openpyxl parsing is CPU-bound Python that threads cannot overlap.
+    Callers on Windows must invoke this under ``if __name__ == "__main__":``.
+    """
+    print("[INFO] Starting full sweep for Excel/CSV → Parquet conversion...")
 
-    target_files = []
-    for subdir in base_dir.rglob("*"):
-        if subdir.is_dir() and ("_Data" in subdir.name or "Perm_Data" in str(subdir)):
-            target_files.extend(list(subdir.glob("*.xlsx")))
+    target_files = list(_walk_source_files(base_dir))
 
     if not target_files:
-        print("[INFO] No Excel files found for conversion.")
+        print("[INFO] No Excel/CSV files found for conversion.")
         return
 
-    print(f"[INFO] {len(target_files)} Excel files detected for conversion.")
+    print(f"[INFO] {len(target_files)} Excel/CSV files detected for conversion.")
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for file in target_files:
+            convert_excel_to_parquet(file)
+        return
 
-    for file in target_files:
-        convert_excel_to_parquet(file)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # convert_excel_to_parquet reports per file and never raises
+        list(pool.map(convert_excel_to_parquet, target_files, chunksize=4))
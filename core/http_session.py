@@ -0,0 +1,30 @@
+# core/http_session.py
+
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+@lru_cache(maxsize=1)
+def get_session() -> requests.Session:
+    """
+    Shared keep-alive session for every KRX / Naver request.
+
+    Connections are pooled across calls (and across the downloader's worker
+    threads), and transient 5xx / connection failures are retried with backoff.
+    The KRX OTP and download calls are idempotent POSTs, so POST is retried too.
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset({"GET", "POST"}),
+    )
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,32 @@
+# core/json_store.py
+
+import json
+import os
+from pathlib import Path
+
+# orjson serialises several times faster; fall back to the stdlib when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json(path: Path):
+    data = Path(path).read_bytes()
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def dump_json(path: Path, obj) -> None:
+    """
+    Write obj as indented UTF-8 JSON, atomically: the data goes to a temp file
+    that then replaces the target, so a crash never leaves a half-written file.
+    """
+    if orjson:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
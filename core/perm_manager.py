@@ -1,10 +1,42 @@
 import os
 import json
+import shutil
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-import requests
+import numpy as np
 import pandas as pd
-import re
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from core.file_converter import clean_columns, read_krx_csv, read_krx_file
+from core._krx_http import download_by_otp, generate_otp
+from core.json_store import dump_json, load_json
+
+# ✅ Non-보통주 name suffixes: 우, (전환), 우B, 우C, 스팩, 00호 ~ 99호
+# (a digit right before 호 is all the old [0-9]{1,2}호$ regex required)
+_NON_COMMON_SUFFIXES = ("우", "(전환)", "우B", "우C", "스팩") + tuple(f"{d}호" for d in "0123456789")
+
+# ✅ Exempt these tickers even if their name matches a suffix
+_EXEMPT_TICKERS = frozenset({"458650", "159910", "294090"})
+
+# Fixed schema of the index-trend dataset. Every part (migrated history and each
+# update) is cast to it, so a column KRX sends as int one day and float the next
+# cannot make parts disagree. 일자 stays 'YYYY/MM/DD' text; numbers are float64.
+INDEX_TREND_SCHEMA = pa.schema(
+    [pa.field("일자", pa.string())]
+    + [pa.field(name, pa.float64()) for name in (
+        "종가", "대비", "등락률", "시가", "고가", "저가", "거래량", "거래대금", "상장시가총액"
+    )]
+)
+
+
+@dataclass
+class StatusEntry:
+    last_updated: str  # YYYY-MM-DD
+    status: str
+
 
 class PermManager:
     def __init__(self, base_dir, status_callback=None):
@@ -30,19 +62,14 @@ class PermManager:
     def load_status(self):
         status_file = self.perm_dir / "perm_status.json"
         if status_file.exists():
-            with open(status_file, "r", encoding="utf-8") as f:
-                self.status_map = json.load(f)
+            self.status_map = {key: StatusEntry(**entry) for key, entry in load_json(status_file).items()}
 
     def save_status(self):
         status_file = self.perm_dir / "perm_status.json"
-        with open(status_file, "w", encoding="utf-8") as f:
-            json.dump(self.status_map, f, indent=2, ensure_ascii=False)
+        dump_json(status_file, {key: asdict(entry) for key, entry in self.status_map.items()})
 
     def _update_status(self, key, status):
-        self.status_map[key] = {
-            "last_updated": datetime.today().strftime("%Y-%m-%d"),
-            "status": status
-        }
+        self.status_map[key] = StatusEntry(datetime.today().strftime("%Y-%m-%d"), status)
         self.save_status()
 
     def check_updates(self):
@@ -53,8 +80,8 @@ class PermManager:
 
     def _check_mock_fundamentals(self):
         key = "mock_fundamentals"
-        status = self.status_map.get(key, {})
-        last_updated = status.get("last_updated")
+        entry = self.status_map.get(key)
+        last_updated = entry.last_updated if entry else None
 
         if not last_updated or (datetime.today() - datetime.strptime(last_updated, "%Y-%m-%d")).days > 7:
             self._download_mock_file()
@@ -77,11 +104,11 @@ class PermManager:
 
     def _check_tradability_file(self):
         key = "tradability_file"
-        status = self.status_map.get(key, {})
-        last_updated = status.get("last_updated")
+        entry = self.status_map.get(key)
+        last_updated = entry.last_updated if entry else None
 
         today_str = datetime.today().strftime("%Y%m%d")
-        filtered_filename = f"전종목_우선주제외_List_{today_str}.xlsx"
+        filtered_filename = f"전종목_우선주제외_List_{today_str}_보통주.parquet"
         filtered_path = self.tradability_dir / filtered_filename
 
         if last_updated == datetime.today().strftime("%Y-%m-%d"):
@@ -93,7 +120,7 @@ class PermManager:
                 latest = self._get_latest_tradability_file()
                 if latest:
                     try:
-                        self.create_filtered_tradability_copy(latest)
+                        self.create_filtered_tradability_copy(self._read_saved_file(latest))
                     except Exception as e:
                         if self.status_callback:
                             self.status_callback(f"❌ Failed to generate filtered file: {e}")
@@ -109,27 +136,26 @@ class PermManager:
                 self.status_callback(f"❌ Tradability file failed: {e}")
 
     def download_and_save_tradability_file(self):
-        otp = self.generate_otp_for_tradability()
-        content = self.download_excel_by_otp(otp)
+        otp = generate_otp("tradability")
+        content = download_by_otp(otp)
 
+        # Parse the CSV once and keep it as parquet; no Excel intermediate
+        df = read_krx_csv(content)
         today_str = datetime.today().strftime("%Y%m%d")
-        file_path = self.tradability_dir / f"전종목_지정내역_{today_str}.xlsx"
-        with open(file_path, "wb") as f:
-            f.write(content)
+        file_path = self.tradability_dir / f"전종목_지정내역_{today_str}.parquet"
+        df.to_parquet(file_path, compression="snappy", index=False)
 
         try:
-            df = pd.read_excel(file_path, engine="openpyxl")
             if df.empty:
                 raise ValueError("Downloaded Tradability file is empty.")
-            self.create_filtered_tradability_copy(file_path)
+            self.create_filtered_tradability_copy(df)
         except Exception as e:
             if self.status_callback:
                 self.status_callback(f"❌ Skipping filtering: {e}")
 
         return file_path
 
-    def create_filtered_tradability_copy(self, source_path):
-        df = pd.read_excel(source_path, engine="openpyxl")
+    def create_filtered_tradability_copy(self, df, legacy=False):
         if df.shape[1] < 2:
             raise ValueError("Unexpected file format: less than 2 columns found.")
 
@@ -141,15 +167,12 @@ class PermManager:
         names = df[stock_name_col].astype(str)
         codes = df[stock_code_col].astype(str).str.zfill(6)
 
-        # ✅ Updated pattern: 우, (전환), 우B, 우C, 스팩, 00호 ~ 99호
-        pattern = re.compile(r"(우$|\(전환\)$|우[BC]$|스팩$|[0-9]{1,2}호$)")
-
-        # ✅ Exempt these tickers even if their name matches pattern
-        exempt_tickers = {"458650", "159910", "294090"}
-
-        # Apply regex to name
-        is_non_common = names.str.contains(pattern)
-        is_exempt = codes.isin(exempt_tickers)
+        # Suffix checks run as numpy string ops over the whole column
+        arr = names.to_numpy(dtype=str)
+        is_non_common = np.zeros(len(arr), dtype=bool)
+        for suffix in _NON_COMMON_SUFFIXES:
+            is_non_common |= np.char.endswith(arr, suffix)
+        is_exempt = codes.isin(_EXEMPT_TICKERS).to_numpy()
 
         # Final mask: non-보통주 AND not exempt
         final_mask = is_non_common & ~is_exempt
@@ -160,48 +183,25 @@ class PermManager:
         # Sheet 1: 보통주
         filtered_sheet1 = df[~final_mask]
 
-        # Save both to Excel
+        # Save each list as its own parquet file (legacy=True: the old two-sheet workbook)
         today_str = datetime.today().strftime("%Y%m%d")
-        output_file = self.tradability_dir / f"전종목_우선주제외_List_{today_str}.xlsx"
+        stem = f"전종목_우선주제외_List_{today_str}"
 
-        with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
-            filtered_sheet1.to_excel(writer, sheet_name="보통주", index=False)
-            filtered_sheet2.to_excel(writer, sheet_name="우선주+스팩주", index=False)
+        if legacy:
+            output_file = self.tradability_dir / f"{stem}.xlsx"
+            with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+                filtered_sheet1.to_excel(writer, sheet_name="보통주", index=False)
+                filtered_sheet2.to_excel(writer, sheet_name="우선주+스팩주", index=False)
+        else:
+            output_file = self.tradability_dir / f"{stem}_보통주.parquet"
+            filtered_sheet1.to_parquet(output_file, compression="snappy", index=False)
+            filtered_sheet2.to_parquet(
+                self.tradability_dir / f"{stem}_우선주_스팩주.parquet", compression="snappy", index=False
+            )
 
         if self.status_callback:
             self.status_callback(f"✔ Filtered Tradability list saved to {output_file.name}")
 
-    def generate_otp_for_tradability(self):
-        url = "http://data.krx.co.kr/comm/fileDn/GenerateOTP/generate.cmd"
-        headers = {
-            "User-Agent": "Mozilla/5.0",
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "Referer": "http://data.krx.co.kr/contents/MDC/MDI/mdiLoader/index.cmd?menuId=MDC0201020202",
-            "Origin": "http://data.krx.co.kr",
-            "X-Requested-With": "XMLHttpRequest"
-        }
-        data = {
-            "name": "fileDown",
-            "url": "dbms/MDC/STAT/standard/MDCSTAT02001",
-            "locale": "ko_KR",
-            "mktId": "ALL",
-            "csvxls_isNo": "false"
-        }
-        response = requests.post(url, headers=headers, data=data)
-        response.raise_for_status()
-        return response.text
-
-    def download_excel_by_otp(self, otp_code):
-        url = "http://data.krx.co.kr/comm/fileDn/download_excel/download.cmd"
-        headers = {
-            "User-Agent": "Mozilla/5.0",
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Referer": "http://data.krx.co.kr"
-        }
-        response = requests.post(url, headers=headers, data={"code": otp_code})
-        response.raise_for_status()
-        return response.content
-
     def _check_index_trend_file(self):
         self._check_index_trend_generic(
             market_name="KOSPI",
@@ -230,14 +230,18 @@ class PermManager:
         now = datetime.now()
         print(f"[DEBUG] Checking index trend for {market_name}...")
 
-        latest_file = self._get_latest_index_file(save_dir, filename_prefix)
-        last_date = None
-        if latest_file:
-            try:
-                last_date_str = latest_file.stem.split("_")[-1].replace(")", "")
-                last_date = datetime.strptime(last_date_str, "%Y%m%d").date()
-            except:
-                pass
+        # History lives in a year/month partitioned parquet dataset; each update
+        # only writes the new rows instead of rewriting the whole file.
+        dataset_dir = save_dir / market_name
+        meta_path = save_dir / f"{market_name}_meta.json"
+        try:
+            self._migrate_legacy_index_file(save_dir, filename_prefix, dataset_dir)
+        except Exception as e:
+            if self.status_callback:
+                self.status_callback(f"❌ Index trend file ({market_name}) migration failed: {e}")
+            return
+        meta = self._load_index_meta(meta_path, dataset_dir)
+        last_date = datetime.strptime(meta["last_date"], "%Y%m%d").date() if meta["last_date"] else None
 
         start_date = (last_date + timedelta(days=1)) if last_date else now.date() - timedelta(days=30)
         end_date = now.date() - timedelta(days=1)
@@ -255,19 +259,17 @@ class PermManager:
             if new_df.empty:
                 raise ValueError("No data rows in new download")
 
-            new_df['일자'] = pd.to_datetime(new_df['일자'], errors='coerce').dt.strftime('%Y/%m/%d')
-            new_df = new_df.sort_values(by='일자', ascending=False)
-
-            if latest_file:
-                existing_df = pd.read_excel(latest_file, engine="openpyxl")
-                combined = pd.concat([new_df, existing_df], ignore_index=True)
-                latest_file.unlink()
-            else:
-                combined = new_df
+            # KRX writes 일자 as YYYY/MM/DD; an explicit format keeps pandas on its vectorised parser
+            new_df['일자'] = pd.to_datetime(
+                new_df['일자'], format='%Y/%m/%d', cache=True, errors='coerce'
+            ).dt.strftime('%Y/%m/%d')
+            new_df = new_df.dropna(subset=['일자']).sort_values(by='일자', ascending=False)
 
-            latest_str = new_df['일자'].str.replace("/", "").max()
-            new_path = save_dir / f"{filename_prefix}_{latest_str}.xlsx"
-            combined.to_excel(new_path, index=False, engine="openpyxl")
+            self._append_index_rows(dataset_dir, new_df)
+            dump_json(meta_path, {
+                "last_date": max(new_df['일자'].max().replace("/", ""), meta["last_date"]),
+                "n_rows": meta["n_rows"] + len(new_df),
+            })
 
             self._update_status(f"index_trend_{market_name.lower()}", "updated")
             if self.status_callback:
@@ -277,52 +279,130 @@ class PermManager:
             if self.status_callback:
                 self.status_callback(f"❌ Index trend file ({market_name}) failed: {e}")
 
+    @staticmethod
+    def _index_trend_table(df):
+        """df → table on INDEX_TREND_SCHEMA; columns KRX did not send are left null."""
+        df = df.set_axis(clean_columns(df.columns), axis=1)
+        columns = []
+        for field in INDEX_TREND_SCHEMA:
+            if field.name not in df.columns:
+                columns.append(pa.nulls(len(df), field.type))
+            elif field.name == "일자":
+                dates = df["일자"]
+                if pd.api.types.is_datetime64_any_dtype(dates):
+                    dates = dates.dt.strftime("%Y/%m/%d")
+                columns.append(pa.array(dates.astype(str), pa.string()))
+            else:
+                values = df[field.name]
+                if not pd.api.types.is_numeric_dtype(values):
+                    values = values.astype(str).str.replace(",", "")
+                columns.append(pa.array(pd.to_numeric(values, errors="coerce"), pa.float64()))
+        return pa.Table.from_arrays(columns, schema=INDEX_TREND_SCHEMA)
+
+    @classmethod
+    def _append_index_rows(cls, dataset_dir, df):
+        table = cls._index_trend_table(df)
+
+        dates = table["일자"]  # 'YYYY/MM/DD'
+        table = table.append_column("year", pc.utf8_slice_codeunits(dates, 0, 4))
+        table = table.append_column("month", pc.utf8_slice_codeunits(dates, 5, 7))
+        pq.write_to_dataset(table, dataset_dir, partition_cols=["year", "month"], compression="snappy")
+
+    @staticmethod
+    def _get_index_last_date(dataset_dir):
+        # Zero-padded year=/month= directory names sort chronologically
+        partitions = sorted(dataset_dir.glob("year=*/month=*"), key=lambda p: (p.parent.name, p.name))
+        if not partitions:
+            return None
+
+        last = None
+        for part in partitions[-1].glob("*.parquet"):
+            meta = pq.read_metadata(part)
+            col = meta.schema.to_arrow_schema().get_field_index("일자")
+            for i in range(meta.num_row_groups):
+                stats = meta.row_group(i).column(col).statistics
+                if stats is None or not stats.has_min_max:
+                    values = pq.read_table(part, columns=["일자"])["일자"]
+                    value = pc.max(values).as_py()
+                else:
+                    value = stats.max
+                if value and (last is None or value > last):
+                    last = value
+        return datetime.strptime(last, "%Y/%m/%d").date() if last else None
+
+    def _load_index_meta(self, meta_path, dataset_dir):
+        # {market}_meta.json carries last_date/n_rows so an update check is one small
+        # file read; rebuild it from the parquet footers when missing or unreadable.
+        if dataset_dir.exists():
+            try:
+                meta = load_json(meta_path)
+                if isinstance(meta["last_date"], str) and isinstance(meta["n_rows"], int):
+                    return meta
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+        last = self._get_index_last_date(dataset_dir)
+        meta = {
+            "last_date": last.strftime("%Y%m%d") if last else "",
+            "n_rows": sum(pq.read_metadata(f).num_rows for f in dataset_dir.glob("year=*/month=*/*.parquet")),
+        }
+        if dataset_dir.exists():
+            dump_json(meta_path, meta)
+        return meta
+
+    def _migrate_legacy_index_file(self, save_dir, prefix, dataset_dir):
+        # One-off: move a single-file history (.xlsx/.parquet) into the dataset
+        legacy = self._get_latest_index_file(save_dir, prefix)
+        if legacy is None or dataset_dir.exists():
+            return
+        df = self._read_saved_file(legacy).dropna(subset=['일자'])
+        self._append_index_rows(dataset_dir, df)
+
+        # Only retire the legacy file once the dataset reads back complete; until
+        # then it stays the sole copy of the history
+        try:
+            migrated = pq.read_table(dataset_dir, columns=["일자"]).num_rows
+        except Exception:
+            migrated = -1
+        if migrated != len(df):
+            shutil.rmtree(dataset_dir, ignore_errors=True)
+            raise RuntimeError(
+                f"Migrating {legacy.name} failed: {migrated} of {len(df)} rows read back"
+            )
+        legacy.rename(legacy.with_name(legacy.name + ".bak"))
+
     def _get_latest_index_file(self, folder, prefix):
-        files = sorted(folder.glob(f"{prefix}_*.xlsx"), reverse=True)
+        files = [f for f in folder.glob(f"{prefix}_*") if f.suffix in (".parquet", ".xlsx")]
+        files.sort(key=lambda f: f.stem, reverse=True)
         return files[0] if files else None
 
+    @staticmethod
+    def _read_saved_file(path):
+        # Files written before the parquet switch may still be .csv/.xlsx
+        if path.suffix == ".parquet":
+            return pd.read_parquet(path)
+        return read_krx_file(path)
+
     def download_index_trend_data(self, start_date, end_date, otp_params):
         date_str_start = start_date.strftime("%Y%m%d")
         date_str_end = end_date.strftime("%Y%m%d")
-        otp = self.generate_otp_for_index_trend(date_str_start, date_str_end, otp_params)
-        content = self.download_excel_by_otp(otp)
-
-        temp_path = self.perm_dir / f"temp_{otp_params['codeNm']}_{date_str_start}_{date_str_end}.xlsx"
-        with open(temp_path, "wb") as f:
-            f.write(content)
-
-        df = pd.read_excel(temp_path, engine="openpyxl")
-        temp_path.unlink()
-        return df
-
-    def generate_otp_for_index_trend(self, start_date, end_date, otp_params):
-        url = "http://data.krx.co.kr/comm/fileDn/GenerateOTP/generate.cmd"
-        headers = {
-            "User-Agent": "Mozilla/5.0",
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "Referer": "http://data.krx.co.kr/contents/MDC/MDI/mdiLoader/index.cmd?menuId=MDC0201020202",
-            "Origin": "http://data.krx.co.kr",
-            "X-Requested-With": "XMLHttpRequest"
-        }
-        data = {
-            "name": "fileDown",
-            "url": "dbms/MDC/STAT/standard/MDCSTAT00301",
-            "locale": "ko_KR",
-            "tboxindIdx_finder_equidx0_12": otp_params['codeNm'],
-            "indIdx": otp_params['indIdx'],
-            "indIdx2": otp_params['indIdx2'],
-            "codeNmindIdx_finder_equidx0_12": otp_params['codeNm'],
-            "param1indIdx_finder_equidx0_12": "",
-            "strtDd": start_date,
-            "endDd": end_date,
-            "share": "2",
-            "money": "3",
-            "csvxls_isNo": "false"
-        }
-        response = requests.post(url, headers=headers, data=data)
-        response.raise_for_status()
-        return response.text
+        otp = generate_otp(
+            "index_trend",
+            tboxindIdx_finder_equidx0_12=otp_params['codeNm'],
+            indIdx=otp_params['indIdx'],
+            indIdx2=otp_params['indIdx2'],
+            codeNmindIdx_finder_equidx0_12=otp_params['codeNm'],
+            param1indIdx_finder_equidx0_12="",
+            strtDd=date_str_start,
+            endDd=date_str_end,
+        )
+        content = download_by_otp(otp)
+        return read_krx_csv(content)
 
     def _get_latest_tradability_file(self):
-        files = sorted(self.tradability_dir.glob("전종목_지정내역_*.xlsx"), reverse=True)
+        files = [
+            f for f in self.tradability_dir.glob("전종목_지정내역_*")
+            if f.suffix in (".parquet", ".csv", ".xlsx")
+        ]
+        files.sort(key=lambda f: f.stem, reverse=True)
         return files[0] if files else None
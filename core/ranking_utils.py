@@ -1,69 +1,54 @@
 # core/ranking_utils.py
 
-import requests
-import pandas as pd
 from pathlib import Path
-import json
-from combine_utils.combine_parquet_by_date import combine_parquet_files
+from concurrent.futures import ThreadPoolExecutor
+from core.file_converter import clean_columns, read_krx_csv
+from core._krx_http import download_by_otp, generate_otp
 
 
-def generate_otp(date_str, investor_type_code):
-    url = "https://data.krx.co.kr/comm/fileDn/GenerateOTP/generate.cmd"
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-        "Referer": "https://data.krx.co.kr/contents/MDC/MDI/outerLoader/index.cmd?screenId=MDCSTAT024",
-        "Origin": "https://data.krx.co.kr",
-        "X-Requested-With": "XMLHttpRequest"
-    }
-    data = {
-        "name": "fileDown",
-        "url": "dbms/MDC/STAT/standard/MDCSTAT02401",
-        "locale": "ko_KR",
-        "mktId": "ALL",
-        "invstTpCd": investor_type_code,
-        "strtDd": date_str,
-        "endDd": date_str,
-        "share": "1",
-        "money": "1",
-        "csvxls_isNo": "false"
-    }
-    response = requests.post(url, headers=headers, data=data)
-    response.raise_for_status()
-    return response.text
-
-
-def download_excel_by_otp(otp_code):
-    url = "https://data.krx.co.kr/comm/fileDn/download_excel/download.cmd"
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Referer": "https://data.krx.co.kr"
-    }
-    response = requests.post(url, headers=headers, data={"code": otp_code})
-    response.raise_for_status()
-    return response.content
+# KRX answers in a few hundred ms per request; this many run at once
+MAX_CONCURRENT_DOWNLOADS = 8
 
 
 def save_krx_data(date_str, investor_type_code, folder, investor_name):
-    otp = generate_otp(date_str, investor_type_code)
-    excel_data = download_excel_by_otp(otp)
-    Path(folder).mkdir(parents=True, exist_ok=True)
-
-    filename = f"{investor_name}_순매수_{date_str}.xlsx"
-    file_path = Path(folder) / filename
-
-    with open(file_path, "wb") as f:
-        f.write(excel_data)
-
-    # Validate and clean up if bad
-    try:
-        df = pd.read_excel(file_path, engine="openpyxl")
-        df.columns = df.columns.str.strip().str.replace('\xa0', '', regex=False)
-        if df.empty or '거래대금_순매수' not in df.columns:
-            file_path.unlink()
-            raise ValueError("No valid data - possibly a holiday")
-    except Exception as e:
-        if file_path.exists():
-            file_path.unlink()
-        raise e
+    """
+    Download one day of 순매수 data. The raw CSV is archived in `folder` and the
+    parsed table is written straight to the sibling *_Parquet folder, where
+    convert_excel_to_parquet would have put it.
+    """
+    otp = generate_otp("ranking", invstTpCd=investor_type_code, strtDd=date_str, endDd=date_str)
+    csv_data = download_by_otp(otp)
+
+    # Validate before anything touches the disk
+    df = read_krx_csv(csv_data)
+    df.columns = clean_columns(df.columns)
+    if df.empty or '거래대금_순매수' not in df.columns:
+        raise ValueError("No valid data - possibly a holiday")
+
+    folder = Path(folder)
+    parquet_folder = folder.with_name(folder.name.replace("_Data", "_Parquet"))
+    folder.mkdir(parents=True, exist_ok=True)
+    parquet_folder.mkdir(parents=True, exist_ok=True)
+
+    stem = f"{investor_name}_순매수_{date_str}"
+    (folder / f"{stem}.csv").write_bytes(csv_data)
+    df.to_parquet(parquet_folder / f"{stem}.parquet", index=False)
+
+
+def save_many(date_strs, investor_type_code, folder, investor_name, max_workers=MAX_CONCURRENT_DOWNLOADS):
+    """
+    Run save_krx_data for several dates concurrently, yielding (date_str, error)
+    in the order given (error is None on success). Results are yielded on the
+    caller's thread, so GUI code can log them directly.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            (date_str, pool.submit(save_krx_data, date_str, investor_type_code, folder, investor_name))
+            for date_str in date_strs
+        ]
+        for date_str, future in futures:
+            try:
+                future.result()
+                yield date_str, None
+            except Exception as e:
+                yield date_str, e
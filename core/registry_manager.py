@@ -1,28 +1,37 @@
 # registry_manager.py
 """
-Minimal file-metadata registry for KRX Excel files.
+Minimal file-metadata registry for KRX download files.
 
-▪ Scans every “*.xlsx” inside folders whose names contain “_Data” or “Perm_Data”.
+▪ Scans every “*.csv” / “*.xlsx” inside folders whose names contain “_Data” or “Perm_Data”.
 ▪ Records:
-    - file_path         absolute path to the Excel file
+    - file_path         absolute path to the CSV/Excel file
     - folder            parent directory (used for summary)
     - date              YYYYMMDD parsed from the filename (if found)
     - parquet_exists    True if the matching .parquet file is present
-    - rows              number of data rows in the Excel (-1 if unreadable)
+    - rows              number of data rows in the file (-1 if unreadable)
     - status            "success" | "empty" | "fail"
+    - mtime_ns, size    file stat at scan time; unchanged files reuse rows/status
 ▪ Saves / loads the registry to JSON (`file_registry.json` in the project root).
+  A columnar copy (`file_registry.parquet`) is written next to it and used by
+  load_registry while it still matches the JSON's mtime.
 ▪ Provides helpers to refresh the registry and compute a folder-level summary.
 """
 
 from __future__ import annotations
 
-import json
 import re
+import zipfile
+import xml.etree.ElementTree as ET
 from pathlib import Path
 from typing import List, Dict
 
+import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core.file_converter import _walk_source_files, clean_columns
+from core.json_store import dump_json, load_json
 
 # ─────────────────────────────── Paths ────────────────────────────────
 BASE_DIR = Path(__file__).resolve().parent
@@ -30,17 +39,22 @@ REGISTRY_JSON = BASE_DIR / "file_registry.json"
 
 # ────────────────────────────── Internals ──────────────────────────────
 _DATE_RE = re.compile(r"(\d{8})")        # grabs first 8-digit block (yyyyMMdd)
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_ROW_TAG = f"{_NS}row"
+_SIDECAR_KEY = b"registry_json_mtime_ns"  # schema metadata tying the sidecar to its JSON
+
+# Column dtypes every load path returns, whichever file the registry came from
+REGISTRY_DTYPES = {
+    "file_path": "str", "folder": "str", "date": "str", "parquet_exists": "bool",
+    "rows": "int64", "status": "str", "mtime_ns": "int64", "size": "int64",
+}
 
 
 def _all_xlsx_files(base_dir: Path) -> List[Path]:
-    all_files = list(base_dir.rglob("*.xlsx"))
-    print(f"[DEBUG] Found {len(all_files)} .xlsx files under {base_dir}")
-    for f in all_files:
-        print(" →", f)
-    return [
-        p for p in all_files
-        if not p.name.startswith("~") and "~$" not in p.name
-    ]
+    # Same single os.scandir pass the Parquet sweep uses, so the registry covers
+    # exactly the files sweep_and_convert_all would convert
+    return list(_walk_source_files(base_dir))
 
 
 
@@ -70,17 +84,100 @@ def _matching_parquet_path(xlsx_path: Path) -> Path:
     return xlsx_path.with_suffix(".parquet")
 
 
+def _is_number(value) -> bool:
+    """True if pd.to_numeric would turn this cell into a non-NaN number."""
+    if isinstance(value, (int, float)):
+        return value == value  # NaN is the only value unequal to itself
+    if isinstance(value, str):
+        try:
+            return float(value) == float(value)
+        except ValueError:
+            return False
+    return False
+
+
+def _xml_text(node) -> str:
+    """Text of an <si>/<is> node: plain <t>, or the <t> of each rich-text run."""
+    t = node.find(f"{_NS}t")
+    if t is not None:
+        return t.text or ""
+    return "".join(r.findtext(f"{_NS}t") or "" for r in node.findall(f"{_NS}r"))
+
+
+def _first_sheet_member(z: zipfile.ZipFile) -> str:
+    """Zip member name of the workbook's first worksheet."""
+    book = ET.fromstring(z.read("xl/workbook.xml"))
+    rid = book.find(f"{_NS}sheets/{_NS}sheet").get(f"{_REL_NS}id")
+    rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+    target = next(rel.get("Target") for rel in rels if rel.get("Id") == rid)
+    return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+
 def _count_rows_fast(xlsx_path: Path) -> int:
+    if xlsx_path.suffix.lower() == ".csv":
+        return _count_csv_rows(xlsx_path)
+
+    # An .xlsx is a zip of XML: stream the first sheet's <row> elements and
+    # count numeric 거래대금_순매수 cells without building any workbook objects.
+    try:
+        with zipfile.ZipFile(xlsx_path) as z:
+            shared = []
+            if "xl/sharedStrings.xml" in z.namelist():
+                shared = [_xml_text(si) for si in ET.fromstring(z.read("xl/sharedStrings.xml"))]
+
+            def cell_value(c):
+                kind = c.get("t", "n")
+                if kind == "inlineStr":
+                    node = c.find(f"{_NS}is")
+                    return _xml_text(node) if node is not None else None
+                v = c.findtext(f"{_NS}v")
+                if v is None or kind == "e":
+                    return None
+                if kind == "s":
+                    return shared[int(v)]
+                if kind in ("n", "b"):
+                    return float(v)
+                return v  # "str": formula result stored as text
+
+            target_col = None
+            count = 0
+            with z.open(_first_sheet_member(z)) as f:
+                for _, row in ET.iterparse(f):
+                    if row.tag != _ROW_TAG:
+                        continue
+                    # Key cells by column letters; fall back to position when "r" is absent
+                    cells = {
+                        c.get("r").rstrip("0123456789") if c.get("r") else i: c
+                        for i, c in enumerate(row.findall(f"{_NS}c"))
+                    }
+                    if target_col is None:
+                        # clean up weird headers; the first of any duplicate names wins
+                        names = clean_columns(cell_value(c) for c in cells.values())
+                        header = dict(reversed(list(zip(names, cells))))
+                        if '거래대금_순매수' not in header:
+                            return -1  # treat as unusable if key column missing
+                        target_col = header['거래대금_순매수']
+                    elif target_col in cells and _is_number(cell_value(cells[target_col])):
+                        count += 1
+                    row.clear()
+            return count if target_col is not None else -1
+    except Exception:
+        return -1
+
+
+def _count_csv_rows(csv_path: Path) -> int:
     try:
-        df = pd.read_excel(xlsx_path, engine="openpyxl")
-        df.columns = df.columns.str.strip().str.replace('\xa0', '', regex=False)  # clean up weird headers
+        # Only the key column is parsed; every other column is skipped by the C reader
+        df = pd.read_csv(
+            csv_path,
+            encoding="euc-kr",
+            usecols=lambda c: clean_columns([c])[0] == '거래대금_순매수',  # clean up weird headers
+        )
 
-        if '거래대금_순매수' not in df.columns:
-            return -1  # treat as unusable if key column missing
+        if df.shape[1] == 0:
+            return -1
 
-        df['거래대금_순매수'] = pd.to_numeric(df['거래대금_순매수'], errors='coerce')
-        df.dropna(subset=['거래대금_순매수'], inplace=True)
-        return len(df)
+        return int(pd.to_numeric(df.iloc[:, 0], errors='coerce').notna().sum())
     except Exception:
         return -1
 
@@ -88,53 +185,107 @@ def _count_rows_fast(xlsx_path: Path) -> int:
 
 
 # ───────────────────────────── Registry API ────────────────────────────
-def refresh_registry(base_dir: Path = BASE_DIR) -> pd.DataFrame:
+def refresh_registry(base_dir: Path = BASE_DIR, force: bool = False) -> pd.DataFrame:
     """
     Scan disk → build a fresh registry DataFrame → save to JSON → return DF.
+
+    Files whose (path, mtime_ns, size) match the saved registry keep their
+    previous rows/status instead of being re-read; pass force=True to rescan all.
     """
     from typing import List, Dict
     import pandas as pd
-    import json
 
     registry_path = base_dir / "file_registry.json"
     print(f"[DEBUG] Saving registry to → {registry_path}")
 
-    records: List[Dict] = []
+    prev: Dict[str, Dict] = {}
+    if not force and registry_path.exists():
+        try:
+            prev = {rec["file_path"]: rec for rec in load_json(registry_path)}
+        except (ValueError, KeyError, TypeError):
+            prev = {}  # unreadable or old-format registry → full rescan
 
-    for xlsx in _all_xlsx_files(base_dir):
-        date_str = _extract_date(xlsx.name)
-        parquet_path = _matching_parquet_path(xlsx)
-        parquet_exists = parquet_path.exists()
-
-        rows = _count_rows_fast(xlsx)
-        status = (
-            "success" if rows > 0 else
-            "empty"   if rows == 0 else
-            "fail"
-        )
+    columns: Dict[str, List] = {
+        name: [] for name in ("file_path", "folder", "date", "parquet_exists", "rows", "mtime_ns", "size")
+    }
 
-        records.append({
-            "file_path": str(xlsx.resolve()),
-            "folder": str(xlsx.parent.resolve()),
-            "date": date_str,
-            "parquet_exists": parquet_exists,
-            "rows": rows,
-            "status": status,
-        })
-
-    df = pd.DataFrame(records)
-    df.to_json(registry_path, orient="records", force_ascii=False, indent=2)
+    for xlsx in _all_xlsx_files(base_dir):
+        file_path = str(xlsx.resolve())
+        st = xlsx.stat()
+        old = prev.get(file_path)
+        if old and old.get("mtime_ns") == st.st_mtime_ns and old.get("size") == st.st_size:
+            rows = old["rows"]
+        else:
+            rows = _count_rows_fast(xlsx)
+
+        columns["file_path"].append(file_path)
+        columns["folder"].append(str(xlsx.parent.resolve()))
+        columns["date"].append(_extract_date(xlsx.name))
+        columns["parquet_exists"].append(_matching_parquet_path(xlsx).exists())
+        columns["rows"].append(rows)
+        columns["mtime_ns"].append(st.st_mtime_ns)
+        columns["size"].append(st.st_size)
+
+    # Status follows from rows alone, so derive it for the whole column at once
+    rows = np.asarray(columns["rows"], dtype=np.int64)
+    status = np.select([rows > 0, rows == 0], ["success", "empty"], default="fail")
+
+    df = pd.DataFrame(columns)
+    df.insert(df.columns.get_loc("rows") + 1, "status", status)
+
+    # Serialise straight from the column lists rather than round-tripping the DataFrame
+    columns["status"] = status.tolist()
+    names = list(df.columns)
+    dump_json(registry_path, [dict(zip(names, values)) for values in zip(*(columns[n] for n in names))])
+    _write_sidecar(df, registry_path)
     return df
 
 
+def _write_sidecar(df: pd.DataFrame, registry_path: Path) -> None:
+    """Columnar copy of the registry, stamped with the JSON's mtime it was written from."""
+    table = pa.Table.from_pandas(df.astype({"status": "category"}), preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), _SIDECAR_KEY: str(registry_path.stat().st_mtime_ns).encode()}
+    pq.write_table(
+        table.replace_schema_metadata(metadata),
+        registry_path.with_suffix(".parquet"),
+        compression="zstd",
+    )
+
+
+def _read_sidecar(registry_path: Path) -> pd.DataFrame | None:
+    """The sidecar's frame, or None if it is missing or the JSON has changed since."""
+    sidecar = registry_path.with_suffix(".parquet")
+    if not sidecar.exists():
+        return None
+    try:
+        stamp = (pq.read_schema(sidecar).metadata or {}).get(_SIDECAR_KEY)
+        if stamp != str(registry_path.stat().st_mtime_ns).encode():
+            return None
+        return pq.read_table(sidecar).to_pandas()
+    except Exception:
+        return None  # unreadable sidecar → fall back to the JSON
+
+
+def _normalize_registry(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast to REGISTRY_DTYPES, so 'date' stays YYYYMMDD text and 'status' plain text."""
+    return df.astype({col: dtype for col, dtype in REGISTRY_DTYPES.items() if col in df.columns})
+
+
+def _read_registry_json(registry_path: Path) -> pd.DataFrame:
+    # From the records as written; pd.read_json would turn '20240102' dates into ints
+    records = load_json(registry_path)
+    if not records:
+        return _normalize_registry(pd.DataFrame(columns=list(REGISTRY_DTYPES)))
+    return _normalize_registry(pd.DataFrame.from_records(records))
+
+
 def load_registry(base_dir: Path = BASE_DIR) -> pd.DataFrame:
     registry_path = base_dir / "file_registry.json"
     print(f"[DEBUG] Loading registry from → {registry_path}")
     if registry_path.exists():
-        return pd.read_json(registry_path)
-    return pd.DataFrame(
-        columns=["file_path", "folder", "date", "parquet_exists", "rows", "status"]
-    )
+        df = _read_sidecar(registry_path)
+        return _normalize_registry(df) if df is not None else _read_registry_json(registry_path)
+    return _normalize_registry(pd.DataFrame(columns=list(REGISTRY_DTYPES)))
 
 
 def summarize_by_folder(registry_df: pd.DataFrame | None = None) -> pd.DataFrame:
@@ -146,14 +297,20 @@ def summarize_by_folder(registry_df: pd.DataFrame | None = None) -> pd.DataFrame
     if registry_df.empty:
         return pd.DataFrame()
 
+    status = registry_df["status"]
     summary = (
         registry_df
+        .assign(
+            success=status.eq("success"),
+            empty=status.eq("empty"),
+            fail=status.eq("fail"),
+        )
         .groupby("folder", as_index=False)
         .agg(
             total_files=("file_path", "count"),
-            success=("status", lambda s: (s == "success").sum()),
-            empty=("status", lambda s: (s == "empty").sum()),
-            fail=("status", lambda s: (s == "fail").sum()),
+            success=("success", "sum"),
+            empty=("empty", "sum"),
+            fail=("fail", "sum"),
             converted=("parquet_exists", "sum"),
         )
     )
@@ -163,7 +320,6 @@ def update_registry_entry(file_path: str):
     After converting one file, update just that record in the registry JSON
     without doing a full refresh.
     """
-    import json
     from pathlib import Path
 
     registry_path = BASE_DIR / "file_registry.json"
@@ -173,8 +329,7 @@ def update_registry_entry(file_path: str):
         return
 
     # Load the list of records
-    with open(registry_path, "r", encoding="utf-8") as f:
-        records = json.load(f)
+    records = load_json(registry_path)
 
     # Find and update the matching entry
     updated = False
@@ -190,8 +345,7 @@ def update_registry_entry(file_path: str):
         return
 
     # Write back the modified list
-    with open(registry_path, "w", encoding="utf-8") as f:
-        json.dump(records, f, indent=2, ensure_ascii=False)
+    dump_json(registry_path, records)
 
 def is_parquet_done(file_path: str) -> bool:
     """
@@ -1,19 +1,37 @@
 import os
+import logging
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from typing import List, Dict, NamedTuple
 from datetime import datetime
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
-from glob import glob
 
 from feature_config import FEATURE_ID_LIST, FEATURE_LABELS
 
+# Per-file chatter goes to DEBUG; run-level messages and errors stay on print
+logger = logging.getLogger(__name__)
+
 def find_latest_common_stock_file(base_dir="Perm_Data/Tradability"):
-    search_path = os.path.join(base_dir, "전종목_우선주제외_List_*.xlsx")
-    candidates = glob(search_path)
-    if not candidates:
+    # 보통주 list is written as parquet; older runs left a two-sheet .xlsx.
+    # One scandir pass with one stat per candidate (free on Windows, where the listing carries it)
+    best = None
+    try:
+        with os.scandir(base_dir) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith("전종목_우선주제외_List_") and name.endswith(("_보통주.parquet", ".xlsx")):
+                    mtime = entry.stat().st_mtime
+                    if best is None or mtime > best[0]:
+                        best = (mtime, entry.path)
+    except FileNotFoundError:
+        pass
+    if best is None:
         raise FileNotFoundError("No 전종목_우선주제외_List files found.")
-    return max(candidates, key=os.path.getmtime)
+    return best[1]
 
 
 # ======== CONFIGURABLE PATHS ========
@@ -21,204 +39,385 @@ FOREIGN_PARQUET_FOLDER = "외국인_순매수_Parquet"
 INSTITUTION_PARQUET_FOLDER = "기관_순매수_Parquet"
 ENHANCED_OUTPUT_BASE = "Enhanced_Data"
 
+COMBINED_NET_BUY_FOLDER = "Combined_순매수_Parquet"
+
+# Only these columns of the combined 순매수 files are merged in
+NET_BUY_COLUMNS = ["종목코드", "일자", "거래대금_순매수"]
+
+# Feature column → (combined file prefix, label used in warnings)
+NET_BUY_SOURCES = {
+    "외국인_순매수": ("Combined_외국인순매수_", "외국인"),
+    "기관_순매수": ("Combined_기관합계순매수_", "기관"),
+}
+
+# Per-stock chart columns the augmenter uses (the downloader names 일자 "날짜")
+STOCK_COLUMNS = ["일자", "날짜", "시가", "고가", "저가", "종가", "거래량", "외국인소진율"]
+
+# Augmented outputs are written once and read by every backtest: zstd level 3
+# is usually noticeably smaller than snappy at a similar write speed, and the
+# repeated 종목코드/종목명/flag values dictionary-encode to almost nothing
+OUTPUT_PARQUET_OPTIONS = {"compression": "zstd", "compression_level": 3, "use_dictionary": True}
+
+# Moving-average windows offered as features (MA_n and 거래대금_MA_n)
+MA_PERIODS = (5, 10, 20, 60, 120)
+
+# Close-price MA windows each derived feature is built from
+_MA_DEPENDENCIES = {
+    "MA5_10_차이율": (5, 10),
+    "MA10_20_차이율": (10, 20),
+    "정배열여부": (5, 10, 20),
+    "MA5_Slope": (5,),
+    "MA10_Slope": (10,),
+    "MA20_Slope": (20,),
+    "골든크로스_MA5_20": (5, 20),
+}
+
 # ======== Load 보통주 종목 정보 ========
 def load_common_stock_info() -> pd.DataFrame:
     perm_path = find_latest_common_stock_file()
-    df = pd.read_excel(perm_path, sheet_name=0)
+    if perm_path.endswith(".parquet"):
+        df = pd.read_parquet(perm_path)
+    else:
+        df = pd.read_excel(perm_path, sheet_name=0)
     df = df[["종목코드", "종목명"]].dropna()
+    df["종목코드"] = df["종목코드"].astype(str).str.zfill(6)  # legacy .xlsx codes come back as ints
     df["보통주여부"] = True
     return df
 
+
+class CommonStockLookup(NamedTuple):
+    code_to_name: Dict[str, str]
+    보통주_set: frozenset
+
+
+@lru_cache(maxsize=1)
+def _common_stock_lookup(perm_path: str, mtime: float) -> CommonStockLookup:
+    df = load_common_stock_info()
+    return CommonStockLookup(
+        code_to_name=dict(zip(df["종목코드"], df["종목명"])),
+        보통주_set=frozenset(df["종목코드"]),
+    )
+
+
+def load_common_stock_lookup() -> CommonStockLookup:
+    """
+    종목코드 → 종목명 and the 보통주 code set, built once per 보통주 list file.
+    Cached on (path, mtime), so a newer or rewritten list is picked up automatically.
+    """
+    perm_path = find_latest_common_stock_file()
+    return _common_stock_lookup(perm_path, os.path.getmtime(perm_path))
+
+# ======== Load per-stock chart data ========
+def read_stock_file(fpath) -> pd.DataFrame:
+    """Read only STOCK_COLUMNS from one per-stock parquet; other column chunks are never decoded."""
+    dataset = ds.dataset(fpath, format="parquet")
+    columns = [c for c in STOCK_COLUMNS if c in dataset.schema.names]
+    return dataset.to_table(columns=columns, use_threads=True).to_pandas()
+
+
+# ======== Load 외국인/기관 순매수 ========
+def _load_latest_net_buy(prefix: str, label: str, stock_code: str | None = None) -> pd.Series:
+    """
+    거래대금_순매수 of the newest matching combined file, indexed by (종목코드, 일자).
+    With stock_code, only that 종목's rows are materialised (filter pushed into the reader).
+    """
+    filters = [("종목코드", "==", stock_code)] if stock_code else None
+    try:
+        latest = max([
+            f for f in os.listdir(COMBINED_NET_BUY_FOLDER)
+            if f.startswith(prefix)
+        ])
+        df = pd.read_parquet(
+            os.path.join(COMBINED_NET_BUY_FOLDER, latest),
+            columns=NET_BUY_COLUMNS, filters=filters, memory_map=True
+        )
+        df["일자"] = pd.to_datetime(df["일자"])
+    except Exception as e:
+        print(f"⚠️ {label} 파일 오류: {e}")
+        return pd.Series(dtype="float64")
+
+    series = df.set_index(["종목코드", "일자"])["거래대금_순매수"]
+    return series[~series.index.duplicated(keep="last")].sort_index()
+
+
+def load_net_buy_data(selected_features: List[str], stock_code: str | None = None) -> Dict[str, pd.Series]:
+    """
+    Load the 순매수 lookups the selected features need; once per run, not per file.
+    Pass stock_code to load a single 종목's rows (augment_single_file on its own).
+    """
+    return {
+        col: _load_latest_net_buy(prefix, label, stock_code)
+        for col, (prefix, label) in NET_BUY_SOURCES.items()
+        if col in selected_features
+    }
+
+
 # ======== MAIN FUNCTION ========
+def write_combined(paths, combined_path):
+    """
+    Append the augmented per-stock files into one parquet, one row group per file.
+    Only one file is held in memory at a time; later files are cast to the first's schema.
+    """
+    writer = None
+    try:
+        for path in paths:
+            table = pq.read_table(path)
+            if writer is None:
+                writer = pq.ParquetWriter(combined_path, table.schema, **OUTPUT_PARQUET_OPTIONS)
+            elif not table.schema.equals(writer.schema):
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def stock_code_of(fname: str) -> str:
+    """종목코드 prefix of a per-stock file name, e.g. 005930_20200101_20241231.parquet."""
+    return fname.replace(".parquet", "").split("_")[0]
+
+
+# 순매수 lookups of the current process, set by _init_net_buy. Each pool worker
+# loads them itself, so the series is never pickled across with the tasks
+_net_buy = None
+
+
+def _init_net_buy(selected_features):
+    global _net_buy
+    _net_buy = load_net_buy_data(selected_features)
+
+
+def _process_one(fname, input_folder, strategy_folder, common, selected_features):
+    """
+    Augment one 보통주 per-stock parquet and write it into strategy_folder.
+    Returns the output path, or None when the file fails.
+    """
+    fpath = os.path.join(input_folder, fname)
+    try:
+        stock_code = stock_code_of(fname)
+
+        logger.debug("🔍 Processing file: %s → 종목코드: %s", fname, stock_code)
+
+        stock_df = read_stock_file(fpath)
+        augmented_df = augment_single_file(
+            df=stock_df,
+            stock_code=stock_code,
+            종목명=common.code_to_name[stock_code],
+            selected_features=selected_features,
+            net_buy=_net_buy
+        )
+
+        out_path = os.path.join(strategy_folder, fname)
+        augmented_df.to_parquet(out_path, index=False, **OUTPUT_PARQUET_OPTIONS)
+        return out_path
+
+    except Exception as e:
+        print(f"❌ Error processing {fname}: {e}")
+        return None
+
+
 def generate_enhanced_dataset(
     input_folder: str,
     output_folder: str,
     strategy_id: str,
     selected_features: List[str],
     save_combined: bool = True,
-    progress_callback = None
+    progress_callback = None,
+    workers: int | None = None
 ):
-    common_df = load_common_stock_info()
-    종목명_to_코드 = dict(zip(common_df["종목명"], common_df["종목코드"]))
-    보통주_set = set(common_df["종목코드"])
+    """
+    Augment every per-stock parquet in input_folder into output_folder/strategy_id.
+
+    Files are independent, so they are augmented in a process pool (``workers``
+    defaults to the CPU count; 1 runs them in this process). Each worker loads the
+    순매수 lookups once at start-up, and returns only the written path, never the
+    frame. Callers on Windows must invoke this under ``if __name__ == "__main__":``.
+    """
+    common = load_common_stock_lookup()
 
     strategy_folder = os.path.join(output_folder, strategy_id)
     os.makedirs(strategy_folder, exist_ok=True)
 
-    all_dfs = []
-
     files = sorted([
         f for f in os.listdir(input_folder)
         if f.endswith(".parquet")
     ])
 
+    # Non-보통주 files are dropped by name before any of them is opened or sent to a worker
+    skipped = [f for f in files if stock_code_of(f) not in common.보통주_set]
+    if skipped:
+        files = [f for f in files if stock_code_of(f) in common.보통주_set]
+        print(f"⚠️ Skipped {len(skipped)} non-보통주 files")
+
     print(f"Processing {len(files)} files from: {input_folder}")
 
-    for fname in tqdm(files):
-        fpath = os.path.join(input_folder, fname)
-        try:
-            stock_df = pd.read_parquet(fpath)
-            stock_code = fname.replace(".parquet", "").split("_")[0]
-
-            print(f"🔍 Processing file: {fname} → 종목코드: {stock_code}")
-
-            if stock_code not in 보통주_set:
-                print(f"⚠️ Skipped (not 보통주): {stock_code}")
-                continue
-
-            augmented_df = augment_single_file(
-                df=stock_df,
-                stock_code=stock_code,
-                종목명_to_코드=종목명_to_코드,
-                selected_features=selected_features
-            )
-
-            out_path = os.path.join(strategy_folder, fname)
-            augmented_df.to_parquet(out_path, index=False)
-            all_dfs.append(augmented_df)
-
-        except Exception as e:
-            print(f"❌ Error processing {fname}: {e}")
-
-    if save_combined and all_dfs:
-        combined_df = pd.concat(all_dfs, ignore_index=True)
-        combined_df.to_parquet(
-            os.path.join(strategy_folder, f"Combined_{strategy_id}.parquet"),
-            index=False
-        )
+    process = partial(
+        _process_one,
+        input_folder=input_folder,
+        strategy_folder=strategy_folder,
+        common=common,
+        selected_features=selected_features,
+    )
+    if workers == 1:
+        _init_net_buy(selected_features)
+        out_paths = [process(fname) for fname in tqdm(files)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_net_buy, initargs=(selected_features,)
+        ) as pool:
+            out_paths = list(tqdm(pool.map(process, files, chunksize=4), total=len(files)))
+
+    out_paths = [path for path in out_paths if path]
+    if save_combined and out_paths:
+        write_combined(out_paths, os.path.join(strategy_folder, f"Combined_{strategy_id}.parquet"))
         print(f"✅ Combined file saved: {strategy_id}")
 
 # ======== AUGMENTATION ========
+def _rolling_means(values: np.ndarray, periods) -> Dict[int, np.ndarray]:
+    """
+    Trailing means for several windows from one shared cumulative sum.
+    Like rolling(window=p).mean(), any NaN inside a window makes it NaN.
+    """
+    n = len(values)
+    missing = np.isnan(values)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, values))))
+    cmissing = np.concatenate(([0], np.cumsum(missing)))
+
+    means = {}
+    for p in periods:
+        mean = np.full(n, np.nan)
+        if n >= p:
+            window = (csum[p:] - csum[:-p]) / p
+            window[cmissing[p:] - cmissing[:-p] > 0] = np.nan
+            mean[p - 1:] = window
+        means[p] = mean
+    return means
+
+
 def augment_single_file(
     df: pd.DataFrame,
     stock_code: str,
-    종목명_to_코드: Dict[str, str],
-    selected_features: List[str]
+    종목명: str,
+    selected_features: List[str],
+    net_buy: Dict[str, pd.Series] | None = None
 ) -> pd.DataFrame:
+    """
+    net_buy maps 외국인_순매수/기관_순매수 to the series from load_net_buy_data();
+    pass it when augmenting many files so the combined files are read once.
+    """
     label_to_id = dict(zip(FEATURE_LABELS, FEATURE_ID_LIST))
     selected_ids = [label_to_id[label] for label in selected_features if label in label_to_id]
 
-    df = df.copy()
-
+    # No up-front df.copy(): every step below returns a new frame, so the
+    # caller's df is never mutated and no column is duplicated needlessly
     if "일자" not in df.columns and "날짜" in df.columns:
-        df.rename(columns={"날짜": "일자"}, inplace=True)
+        df = df.rename(columns={"날짜": "일자"})
 
     if "일자" not in df.columns:
         raise ValueError("⚠️ 날짜/일자 컬럼이 없습니다.")
 
-    df["일자"] = pd.to_datetime(df["일자"])
-    df.sort_values("일자", inplace=True)
-    df.reset_index(drop=True, inplace=True)
+    # The downloader stores 날짜 as a timestamp already; only parse when it is not
+    dates = df["일자"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, cache=True)
 
-    df["종목코드"] = stock_code
-    df["보통주여부"] = True
+    df = df.assign(
+        일자=dates,
+        종목코드=stock_code,
+        보통주여부=True,
+        종목명=종목명,
+    ).sort_values("일자", ignore_index=True)
 
-    # Look up 종목명 from 종목명_to_코드
-    code_to_name = {v: k for k, v in 종목명_to_코드.items()}
-    df["종목명"] = code_to_name.get(stock_code, "Unknown")
+    # === Price/volume features, computed on raw arrays and attached in one step ===
+    close = df["종가"].to_numpy(dtype=np.float64)
+    features = {}
 
     if "거래대금" in selected_ids:
-        df["거래대금"] = ((df["고가"] + df["저가"]) / 2) * df["거래량"]
-
-    # === Precompute MAs if needed for dependent features ===
-    required_ma_periods = [5, 10, 20, 60, 120]
-    for period in required_ma_periods:
-        col = f"MA_{period}"
-        if any(sel.startswith(col) or sel.endswith(col) for sel in selected_ids):
-            df[col] = df["종가"].rolling(window=period).mean()
+        high = df["고가"].to_numpy(dtype=np.float64)
+        low = df["저가"].to_numpy(dtype=np.float64)
+        features["거래대금"] = (high + low) / 2 * df["거래량"].to_numpy(dtype=np.float64)
+
+    # MA windows that are selected directly or that a derived feature is built from
+    periods = sorted(
+        {p for p in MA_PERIODS if f"MA_{p}" in selected_ids}
+        | {p for sel in selected_ids for p in _MA_DEPENDENCIES.get(sel, ())}
+    )
+    ma = _rolling_means(close, periods)
+    for period in periods:
+        if f"MA_{period}" in selected_ids:
+            features[f"MA_{period}"] = ma[period]
 
     if "등락률" in selected_ids:
-        df["등락률"] = df["종가"].pct_change().fillna(0) * 100
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = np.concatenate(([np.nan], close[1:] / close[:-1] - 1))
+        features["등락률"] = np.where(np.isnan(change), 0.0, change) * 100
 
-    for period in required_ma_periods:
-        vol_col = f"거래대금_MA_{period}"
-        if vol_col in selected_ids and "거래대금" in df.columns:
-            df[vol_col] = df["거래대금"].rolling(window=period).mean()
+    # 거래대금_MA_n is only produced alongside 거래대금 itself
+    value_periods = [p for p in MA_PERIODS if f"거래대금_MA_{p}" in selected_ids]
+    if value_periods and "거래대금" in features:
+        value_ma = _rolling_means(features["거래대금"], value_periods)
+        for period in value_periods:
+            features[f"거래대금_MA_{period}"] = value_ma[period]
 
     if "MA5_10_차이율" in selected_ids:
-        df["MA5_10_차이율"] = (df["MA_5"] - df["MA_10"]) / df["MA_10"] * 100
+        features["MA5_10_차이율"] = (ma[5] - ma[10]) / ma[10] * 100
 
     if "MA10_20_차이율" in selected_ids:
-        df["MA10_20_차이율"] = (df["MA_10"] - df["MA_20"]) / df["MA_20"] * 100
+        features["MA10_20_차이율"] = (ma[10] - ma[20]) / ma[20] * 100
 
     if "정배열여부" in selected_ids:
-        df["정배열여부"] = (df["MA_5"] > df["MA_10"]) & (df["MA_10"] > df["MA_20"])
+        features["정배열여부"] = (ma[5] > ma[10]) & (ma[10] > ma[20])
 
     for period in [5, 10, 20]:
         slope_col = f"MA{period}_Slope"
         if slope_col in selected_ids:
-            df[slope_col] = df[f"MA_{period}"].diff()
+            features[slope_col] = np.diff(ma[period], prepend=np.nan)
 
     if "골든크로스_MA5_20" in selected_ids:
-        prev_ma5 = df["MA_5"].shift(1)
-        prev_ma20 = df["MA_20"].shift(1)
-        df["골든크로스_MA5_20"] = (
-            (df["MA_5"] > df["MA_20"]) & (prev_ma5 <= prev_ma20)
-        )
-
-    if "외국인_순매수" in selected_ids or "기관_순매수" in selected_ids:
-        combined_dir = "Combined_순매수_Parquet"
-
-        try:
-            latest_foreign = max([
-                f for f in os.listdir(combined_dir)
-                if f.startswith("Combined_외국인순매수_")
-            ])
-            foreign_df = pd.read_parquet(os.path.join(combined_dir, latest_foreign))
-            foreign_df["일자"] = pd.to_datetime(foreign_df["일자"])
-        except Exception as e:
-            print(f"⚠️ 외국인 파일 오류: {e}")
-            foreign_df = pd.DataFrame()
-
-        try:
-            latest_inst = max([
-                f for f in os.listdir(combined_dir)
-                if f.startswith("Combined_기관합계순매수_")
-            ])
-            inst_df = pd.read_parquet(os.path.join(combined_dir, latest_inst))
-            inst_df["일자"] = pd.to_datetime(inst_df["일자"])
-        except Exception as e:
-            print(f"⚠️ 기관 파일 오류: {e}")
-            inst_df = pd.DataFrame()
-
-        if "외국인_순매수" in selected_ids and not foreign_df.empty:
-            df = df.merge(
-                foreign_df[["종목코드", "일자", "거래대금_순매수"]]
-                    .rename(columns={"거래대금_순매수": "외국인_순매수"}),
-                on=["종목코드", "일자"], how="left"
-            )
-
-        if "기관_순매수" in selected_ids and not inst_df.empty:
-            df = df.merge(
-                inst_df[["종목코드", "일자", "거래대금_순매수"]]
-                    .rename(columns={"거래대금_순매수": "기관_순매수"}),
-                on=["종목코드", "일자"], how="left"
-            )
-
-        # Clean any duplicated columns from earlier merges
-        for col in ["외국인_순매수", "기관_순매수"]:
-            if f"{col}_x" in df.columns and f"{col}_y" in df.columns:
-                df.drop(columns=[f"{col}_x"], inplace=True)
-                df.rename(columns={f"{col}_y": col}, inplace=True)
+        prev_ma5 = np.concatenate(([np.nan], ma[5][:-1]))
+        prev_ma20 = np.concatenate(([np.nan], ma[20][:-1]))
+        features["골든크로스_MA5_20"] = (ma[5] > ma[20]) & (prev_ma5 <= prev_ma20)
+
+    if features:
+        df = df.assign(**features)
+
+    # 외국인/기관 순매수: positional lookup on the preloaded (종목코드, 일자) series
+    if net_buy is None:
+        net_buy = load_net_buy_data(selected_ids, stock_code)
+    if net_buy:
+        keys = pd.MultiIndex.from_arrays([df["종목코드"], df["일자"]])
+        for col, series in net_buy.items():
+            if col in selected_ids and not series.empty:
+                df[col] = series.reindex(keys).to_numpy()
 
     # === Placeholder Simulation Columns ===
     for col in ["MA5_최대상승률", "MA10_최대상승률", "MDD_진입이후"]:
         if col in selected_ids:
             df[col] = np.nan
 
-    print(f"✅ Augmented {stock_code} → {df.columns.tolist()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("✅ Augmented %s → %s", stock_code, df.columns.tolist())
 
     mandatory_columns = ["일자", "종목명", "종목코드", "시가", "고가", "저가", "종가", "거래량", "외국인소진율"]
 
+    # A column belongs to a selection if it equals it or extends it with "_…".
+    # Look its own "_"-prefixes up in a rank table (one pass over the columns)
+    # and keep the old order: by first matching selection, then column order.
+    rank = {}
+    for i, sel in enumerate(selected_ids):
+        rank.setdefault(sel, i)
+    matched = []
+    for pos, col in enumerate(df.columns):
+        prefixes = [col] + [col[:i] for i, ch in enumerate(col) if ch == "_"]
+        ranks = [rank[p] for p in prefixes if p in rank]
+        if ranks:
+            matched.append((min(ranks), pos, col))
+
     final_columns = list(dict.fromkeys(
-        mandatory_columns + [
-            col for sel in selected_ids
-            for col in df.columns
-            if col == sel or col.startswith(sel + "_")
-        ]
+        mandatory_columns + [col for _, _, col in sorted(matched)]
     ))
 
-    print(f"[DEBUG] Selected final columns: {final_columns}")
+    logger.debug("Selected final columns: %s", final_columns)
     df = df[final_columns]
 
     return df
@@ -0,0 +1,104 @@
+# gui/pandas_model.py
+
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import QBrush, QColor
+
+# Formatted display strings kept per model; Qt re-asks for the same cells while scrolling
+DISPLAY_CACHE_SIZE = 4096
+
+
+class PandasModel(QAbstractTableModel):
+    """
+    Read-only table model over a DataFrame. Qt asks only for the cells it paints,
+    so nothing is converted up front however many rows the frame has.
+
+    formatters:  column → callable(value) -> str, for the display text
+    backgrounds: column → {cell value: color}, e.g. status colouring
+    """
+
+    def __init__(self, df=None, formatters=None, backgrounds=None, parent=None):
+        super().__init__(parent)
+        self._set_frame(pd.DataFrame() if df is None else df)
+        self._formatters = formatters or {}
+        self._backgrounds = {
+            col: {value: QBrush(QColor(color)) for value, color in colors.items()}
+            for col, colors in (backgrounds or {}).items()
+        }
+
+    def _set_frame(self, df: pd.DataFrame):
+        # One ndarray per column: positional lookups skip pandas' indexing layer
+        self._df = df
+        self._columns = [df[c].to_numpy() for c in df.columns]
+        self._display_cache = OrderedDict()
+
+    def setDataFrame(self, df: pd.DataFrame):
+        self.beginResetModel()
+        self._set_frame(df)
+        self.endResetModel()
+
+    def dataFrame(self) -> pd.DataFrame:
+        return self._df
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._df)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._df.shape[1]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            key = (row, col)
+            text = self._display_cache.get(key)
+            if text is not None:
+                self._display_cache.move_to_end(key)
+                return text
+            value = self._columns[col][row]
+            formatter = self._formatters.get(self._df.columns[col])
+            text = formatter(value) if formatter else str(value)
+            self._display_cache[key] = text
+            if len(self._display_cache) > DISPLAY_CACHE_SIZE:
+                self._display_cache.popitem(last=False)
+            return text
+        if role == Qt.BackgroundRole:
+            colors = self._backgrounds.get(self._df.columns[col])
+            if colors:
+                return colors.get(self._columns[col][row])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return str(self._df.columns[section])
+            else:
+                return str(section + 1)
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if self._df.empty:
+            return
+        self.layoutAboutToBeChanged.emit()
+        self._set_frame(self._df.sort_values(
+            self._df.columns[column], ascending=(order == Qt.AscendingOrder), kind="stable"
+        ))
+        self.layoutChanged.emit()
+
+
+def read_parquet_head(fpath, n_rows):
+    """First n_rows of a parquet file; decodes only the leading row groups' pages."""
+    pf = pq.ParquetFile(fpath)
+    batches, total = [], 0
+    for batch in pf.iter_batches(batch_size=n_rows):
+        batches.append(batch)
+        total += batch.num_rows
+        if total >= n_rows:
+            break
+    table = pa.Table.from_batches(batches, schema=pf.schema_arrow)
+    return table.slice(0, n_rows).to_pandas()
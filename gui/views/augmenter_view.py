@@ -5,42 +5,77 @@ from PySide6.QtCore import Qt
 import os
 from pathlib import Path
 
-import pandas as pd
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QPushButton,
     QHBoxLayout, QLineEdit, QCheckBox, QFileDialog,
     QListWidget, QSplitter, QTableView, QMessageBox
 )
-from PySide6.QtCore import Qt, QAbstractTableModel
+from PySide6.QtCore import Qt, QThread, Signal
 
 from feature_config import FEATURE_ID_LIST, FEATURE_LABELS
+from gui.pandas_model import PandasModel, read_parquet_head
 from data_augmenter import generate_enhanced_dataset  # will pass progress_callback later
 
 from PySide6.QtWidgets import QGridLayout
 
-class PandasModel(QAbstractTableModel):
-    def __init__(self, df: pd.DataFrame):
-        super().__init__()
-        self._df = df
+PREVIEW_ROWS = 200
+
 
-    def rowCount(self, _):
-        return len(self._df)
+class AugmentWorker(QThread):
+    """Augments the given per-stock files off the GUI thread."""
+    progress = Signal(int)
+    succeeded = Signal()
+    cancelled = Signal()
+    failed = Signal(str)
 
-    def columnCount(self, _):
-        return len(self._df.columns)
+    def __init__(self, parquet_files, output_folder, strategy_id, selected_features, parent=None):
+        super().__init__(parent)
+        self.parquet_files = parquet_files
+        self.output_folder = output_folder
+        self.strategy_id = strategy_id
+        self.selected_features = selected_features
 
-    def data(self, index, role):
-        if role == Qt.DisplayRole:
-            return str(self._df.iloc[index.row(), index.column()])
-        return None
+    def run(self):
+        from data_augmenter import (
+            OUTPUT_PARQUET_OPTIONS, augment_single_file, load_common_stock_lookup,
+            load_net_buy_data, read_stock_file, stock_code_of, write_combined
+        )
 
-    def headerData(self, section, orientation, role):
-        if role == Qt.DisplayRole:
-            if orientation == Qt.Horizontal:
-                return self._df.columns[section]
-            else:
-                return str(section)
-        return None
+        try:
+            common = load_common_stock_lookup()
+            net_buy = load_net_buy_data(self.selected_features)
+            out_paths = []
+
+            for i, fpath in enumerate(self.parquet_files):
+                if self.isInterruptionRequested():
+                    self.cancelled.emit()
+                    return
+                self.progress.emit(i)
+
+                fname = fpath.name
+                stock_code = stock_code_of(fname)
+                if stock_code not in common.보통주_set:
+                    continue
+
+                df = read_stock_file(fpath)
+                enhanced_df = augment_single_file(
+                    df=df,
+                    stock_code=stock_code,
+                    종목명=common.code_to_name[stock_code],
+                    selected_features=self.selected_features,
+                    net_buy=net_buy
+                )
+
+                enhanced_df.to_parquet(self.output_folder / fname, index=False, **OUTPUT_PARQUET_OPTIONS)
+                out_paths.append(self.output_folder / fname)
+
+            if out_paths:
+                write_combined(out_paths, self.output_folder / f"Combined_{self.strategy_id}.parquet")
+
+            self.succeeded.emit()
+
+        except Exception as e:
+            self.failed.emit(str(e))
 
 
 class AugmenterView(QWidget):
@@ -140,8 +175,7 @@ class AugmenterView(QWidget):
         if not fpath.exists():
             return
         try:
-            df = pd.read_parquet(fpath)
-            self.preview.setModel(PandasModel(df.head(200)))
+            self.preview.setModel(PandasModel(read_parquet_head(fpath, PREVIEW_ROWS)))
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load preview: {e}")
 
@@ -169,53 +203,35 @@ class AugmenterView(QWidget):
             QMessageBox.warning(self, "No files", "No .parquet files found in the input folder.")
             return
 
+        output_folder = Path("Enhanced_Data") / strategy_id
+        output_folder.mkdir(parents=True, exist_ok=True)
+
         progress = QProgressDialog("Running augmentation...", "Cancel", 0, total, self)
         progress.setWindowModality(Qt.WindowModal)
         progress.setMinimumDuration(0)
         progress.setValue(0)
 
-        output_folder = Path("Enhanced_Data") / strategy_id
-        output_folder.mkdir(parents=True, exist_ok=True)
-
-        from data_augmenter import augment_single_file, load_common_stock_info
-
-        try:
-            common_df = load_common_stock_info()
-            종목명_to_코드 = dict(zip(common_df["종목명"], common_df["종목코드"]))
-            보통주_set = set(common_df["종목코드"])
-            all_dfs = []
-
-            for i, fpath in enumerate(parquet_files):
-                progress.setValue(i)
-                if progress.wasCanceled():
-                    QMessageBox.information(self, "Cancelled", "Operation cancelled by user.")
-                    return
-
-                fname = fpath.name
-                stock_code = fname.replace(".parquet", "").split("_")[0]
-                if stock_code not in 보통주_set:
-                    continue
-
-                df = pd.read_parquet(fpath)
-                enhanced_df = augment_single_file(
-                    df=df,
-                    stock_code=stock_code,
-                    종목명_to_코드=종목명_to_코드,
-                    selected_features=selected_features
-                )
-
-                enhanced_df.to_parquet(output_folder / fname, index=False)
-                all_dfs.append(enhanced_df)
-
-            if all_dfs:
-                combined_df = pd.concat(all_dfs, ignore_index=True)
-                combined_df.to_parquet(output_folder / f"Combined_{strategy_id}.parquet", index=False)
-
-            self.aug_folder_input.setText(str(output_folder))
-            QMessageBox.information(self, "Success", "✅ Augmentation completed")
-
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"❌ Failed: {e}")
-
+        # The loop runs on a worker thread so the dialog repaints and Cancel is
+        # honoured between files; results come back as queued signals
+        worker = AugmentWorker(parquet_files, output_folder, strategy_id, selected_features, self)
+        worker.progress.connect(progress.setValue)
+        progress.canceled.connect(worker.requestInterruption)
+        worker.succeeded.connect(lambda: self.on_augmentation_succeeded(output_folder))
+        worker.cancelled.connect(
+            lambda: QMessageBox.information(self, "Cancelled", "Operation cancelled by user.")
+        )
+        worker.failed.connect(lambda msg: QMessageBox.critical(self, "Error", f"❌ Failed: {msg}"))
+        worker.finished.connect(lambda: self.on_augmentation_finished(progress, total))
+
+        self.start_btn.setEnabled(False)
+        self._worker = worker
+        worker.start()
+
+    def on_augmentation_succeeded(self, output_folder):
+        self.aug_folder_input.setText(str(output_folder))
+        QMessageBox.information(self, "Success", "✅ Augmentation completed")
+
+    def on_augmentation_finished(self, progress, total):
         progress.setValue(total)
+        self.start_btn.setEnabled(True)
         self.refresh_file_list()
@@ -1,5 +1,5 @@
 # backtest_MA5_view.py
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QThread, Signal
 
 from PySide6.QtWidgets import (
     QWidget, QLabel, QPushButton, QLineEdit, QVBoxLayout, QHBoxLayout,
@@ -7,7 +7,36 @@ from PySide6.QtWidgets import (
 )
 
 import os
-import subprocess
+import traceback
+
+from core.backtest_runner_MA5 import run as run_ma5_backtest
+
+
+class BacktestWorker(QThread):
+    """Runs the MA5 backtest in-process off the GUI thread, streaming its log lines."""
+    log = Signal(str)
+
+    def __init__(self, parquet_path, strategy_id, params, manual_trigger=None, parent=None):
+        super().__init__(parent)
+        self.parquet_path = parquet_path
+        self.strategy_id = strategy_id
+        self.params = params
+        self.manual_trigger = manual_trigger
+
+    def run(self):
+        try:
+            run_ma5_backtest(
+                self.parquet_path, self.strategy_id, *self.params,
+                manual_trigger=self.manual_trigger,
+                # Never fork/spawn a pool from inside the running Qt process;
+                # the process pool is for the CLI's --workers path only
+                workers=1,
+                log=self.log.emit,
+            )
+        except Exception:
+            self.log.emit("❌ Error running backtest:")
+            self.log.emit(traceback.format_exc())
+
 
 class BacktestMA5View(QWidget):
     def __init__(self, parent=None):
@@ -141,13 +170,9 @@ class BacktestMA5View(QWidget):
             self.log_output.append("❌ Invalid file path.")
             return
 
-        # Prepare command-line arguments including user parameters
         strategy_id = self.strategy_id_field.text().strip()
 
-        args = [
-            "python", "core/backtest_runner_MA5.py",
-            parquet_path,
-            strategy_id,
+        params = [
             self.input_pct_change.text().strip() if self.toggle_pct_change.isChecked() else "",
             self.input_pct_change_max.text().strip() if self.toggle_pct_change_max.isChecked() else "",
             self.input_trading_value.text().strip() if self.toggle_trading_value.isChecked() else "",
@@ -156,23 +181,15 @@ class BacktestMA5View(QWidget):
             self.input_institution.text().strip() if self.toggle_institution.isChecked() else "",
         ]
 
-        manual_trigger_path = self.manual_trigger_field.text().strip()
-        if manual_trigger_path:
-            args.append("--manual-trigger")
-            args.append(manual_trigger_path)
+        manual_trigger_path = self.manual_trigger_field.text().strip() or None
 
         self.log_output.append(f"▶ Running backtest on: {parquet_path}")
-        self.log_output.append(f"Parameters: {args[2:]}")
-
-        try:
-            result = subprocess.run(
-                args,
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                check=True
-            )
-            self.log_output.append(result.stdout)
-        except subprocess.CalledProcessError as e:
-            self.log_output.append("❌ Error running backtest:")
-            self.log_output.append(e.stderr)
+        self.log_output.append(f"Parameters: {[strategy_id, *params]}")
+
+        # Runs in this process on a worker thread: no interpreter/pandas start-up
+        # per run, and log lines reach the view as they are produced
+        self.start_button.setEnabled(False)
+        self._worker = BacktestWorker(parquet_path, strategy_id, params, manual_trigger_path, self)
+        self._worker.log.connect(self.log_output.append)
+        self._worker.finished.connect(lambda: self.start_button.setEnabled(True))
+        self._worker.start()
@@ -1,15 +1,50 @@
 from PySide6.QtWidgets import (
     QWidget, QLabel, QVBoxLayout, QHBoxLayout,
     QPushButton, QLineEdit, QDateEdit, QTextEdit,
-    QListWidget, QListWidgetItem, QSplitter, QScrollArea
+    QListView, QAbstractItemView, QSplitter, QScrollArea, QTableView
+)
+from PySide6.QtCore import (
+    QDate, Qt, QThread, QTimer, Signal, QStringListModel, QSortFilterProxyModel,
+    QFileSystemWatcher
 )
-from PySide6.QtCore import QDate, Qt
 from datetime import datetime
 import traceback
 import os
 import pandas as pd
 
 from core.chart_downloader import download_daily_candlestick_data
+from gui.pandas_model import PandasModel, read_parquet_head
+
+# Rows rendered into the preview pane; the rest of the file is never decoded
+PREVIEW_ROWS = 200
+
+CANDLE_FOLDER = os.path.join("Chart_Data", "DailyCandle")
+
+# Quiet period after the last keystroke (or folder change) before the list is refreshed
+SEARCH_DEBOUNCE_MS = 120
+
+
+class CandleDownloadWorker(QThread):
+    """Runs the (network-bound) candle download off the GUI thread, streaming log lines."""
+    log = Signal(str)
+
+    def __init__(self, symbols, start, end, save_dir, parent=None):
+        super().__init__(parent)
+        self.symbols = symbols
+        self.start_date = start
+        self.end_date = end
+        self.save_dir = save_dir
+
+    def run(self):
+        try:
+            os.makedirs(self.save_dir, exist_ok=True)
+            download_daily_candlestick_data(
+                self.symbols, self.start_date, self.end_date, self.save_dir, logger=self.log.emit
+            )
+            self.log.emit("✅ 다운로드 완료.")
+        except Exception as e:
+            self.log.emit(f"❌ 에러 발생: {str(e)}")
+            self.log.emit(traceback.format_exc())
 
 
 class CandleDownloadView(QWidget):
@@ -53,24 +88,40 @@ class CandleDownloadView(QWidget):
 
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("🔍 파일 검색 (예: 005930)")
-        self.search_input.textChanged.connect(self.filter_file_list)
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self._filter_timer.timeout.connect(self.refresh_file_list)
+        self.search_input.textChanged.connect(lambda _: self._filter_timer.start())
         left_panel.addWidget(self.search_input)
 
         self.file_count_label = QLabel("📦 파일 수: 0")
         left_panel.addWidget(self.file_count_label)
 
-        self.file_list = QListWidget()
-        self.file_list.itemClicked.connect(self.preview_file)
-        self.file_list.setSelectionMode(QListWidget.SingleSelection)
+        # Filtering hides rows in the proxy; the full list is never rebuilt per keystroke
+        self.all_parquet_files = []
+        self._dir_mtime = None  # folder mtime the list was last built from
+        self.file_model = QStringListModel(self)
+        self.file_proxy = QSortFilterProxyModel(self)
+        self.file_proxy.setSourceModel(self.file_model)
+        self.file_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+        self.file_list = QListView()
+        self.file_list.setModel(self.file_proxy)
+        self.file_list.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.file_list.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.file_list.clicked.connect(self.preview_file)
         left_panel.addWidget(self.file_list)
 
         left_widget = QWidget()
         left_widget.setLayout(left_panel)
         splitter.addWidget(left_widget)
 
-        # File preview (right)
-        self.file_preview = QTextEdit()
-        self.file_preview.setReadOnly(True)
+        # File preview (right): cells are formatted only as Qt paints them
+        self.preview_model = PandasModel()
+        self.file_preview = QTableView()
+        self.file_preview.setModel(self.preview_model)
+        self.file_preview.setSortingEnabled(True)
         splitter.addWidget(self.file_preview)
         splitter.setSizes([200, 600])
 
@@ -83,8 +134,11 @@ class CandleDownloadView(QWidget):
 
         self.setLayout(main_layout)
 
-        # Load existing files
+        # Load existing files, then follow the folder instead of polling it
+        os.makedirs(CANDLE_FOLDER, exist_ok=True)
         self.refresh_file_list()
+        self.watcher = QFileSystemWatcher([CANDLE_FOLDER], self)
+        self.watcher.directoryChanged.connect(lambda _: self._filter_timer.start())
 
     def log(self, message: str):
         timestamp = datetime.now().strftime("[%H:%M:%S]")
@@ -102,38 +156,47 @@ class CandleDownloadView(QWidget):
 
         self.log(f"🔍 다운로드 시작: {', '.join(symbols)} / {start} ~ {end}")
 
-        try:
-            save_dir = os.path.join("Chart_Data", "DailyCandle")
-            os.makedirs(save_dir, exist_ok=True)
-            download_daily_candlestick_data(symbols, start, end, save_dir, logger=self.log)
-            self.log("✅ 다운로드 완료.")
-            self.refresh_file_list()
-        except Exception as e:
-            self.log(f"❌ 에러 발생: {str(e)}")
-            self.log(traceback.format_exc())
+        # The download runs on a worker thread (symbols are fetched concurrently
+        # inside chart_downloader); log lines arrive here as queued signals
+        save_dir = CANDLE_FOLDER
+        self.download_button.setEnabled(False)
+        self._worker = CandleDownloadWorker(symbols, start, end, save_dir, self)
+        self._worker.log.connect(self.log)
+        self._worker.finished.connect(self.on_download_finished)
+        self._worker.start()
+
+    def on_download_finished(self):
+        # New files show up through the folder watcher
+        self.download_button.setEnabled(True)
 
     def refresh_file_list(self):
-        self.file_list.clear()
-        self.all_parquet_files = []
-        folder = os.path.join("Chart_Data", "DailyCandle")
-        if os.path.exists(folder):
-            self.all_parquet_files = sorted(f for f in os.listdir(folder) if f.endswith(".parquet"))
+        # Adding or removing a file bumps the folder's mtime; if it hasn't moved
+        # the listing we already have is still current
+        try:
+            mtime = os.stat(CANDLE_FOLDER).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None or mtime != self._dir_mtime:
+            self._dir_mtime = mtime
+            self.all_parquet_files = []
+            if mtime is not None:
+                with os.scandir(CANDLE_FOLDER) as it:
+                    self.all_parquet_files = sorted(
+                        e.name for e in it
+                        if e.name.endswith(".parquet") and e.is_file(follow_symlinks=False)
+                    )
+            self.file_model.setStringList(self.all_parquet_files)
         self.filter_file_list()  # Apply current search filter
 
-    def preview_file(self, item):
-        filename = item.text()
-        full_path = os.path.join("Chart_Data", "DailyCandle", filename)
+    def preview_file(self, index):
+        filename = index.data()
+        full_path = os.path.join(CANDLE_FOLDER, filename)
         try:
-            df = pd.read_parquet(full_path)
-            preview_text = df.to_string(index=False)
-            self.file_preview.setPlainText(preview_text)
+            self.preview_model.setDataFrame(read_parquet_head(full_path, PREVIEW_ROWS))
         except Exception as e:
-            self.file_preview.setPlainText(f"파일 로딩 실패: {str(e)}")
+            self.preview_model.setDataFrame(pd.DataFrame())
+            self.log(f"❌ 파일 로딩 실패: {filename}: {str(e)}")
 
     def filter_file_list(self):
-        query = self.search_input.text().strip().lower()
-        self.file_list.clear()
-        filtered = [f for f in self.all_parquet_files if query in f.lower()]
-        for f in filtered:
-            self.file_list.addItem(QListWidgetItem(f))
-        self.file_count_label.setText(f"📦 파일 수: {len(filtered)}")
+        self.file_proxy.setFilterFixedString(self.search_input.text().strip())
+        self.file_count_label.setText(f"📦 파일 수: {self.file_proxy.rowCount()}")
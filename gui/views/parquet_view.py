@@ -2,37 +2,14 @@
 
 import os
 import pandas as pd
+import pyarrow.parquet as pq
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QListWidget, QTableView,
     QFileDialog, QPushButton, QHBoxLayout, QAbstractItemView
 )
-from PySide6.QtCore import Qt, QAbstractTableModel
+from PySide6.QtCore import Qt
 
-
-class PandasModel(QAbstractTableModel):
-    def __init__(self, df=pd.DataFrame()):
-        super().__init__()
-        self._df = df
-
-    def rowCount(self, parent=None):
-        return len(self._df)
-
-    def columnCount(self, parent=None):
-        return self._df.shape[1]
-
-    def data(self, index, role=Qt.DisplayRole):
-        if role == Qt.DisplayRole:
-            value = self._df.iloc[index.row(), index.column()]
-            return str(value)
-        return None
-
-    def headerData(self, section, orientation, role=Qt.DisplayRole):
-        if role == Qt.DisplayRole:
-            if orientation == Qt.Horizontal:
-                return self._df.columns[section]
-            else:
-                return str(section + 1)
-        return None
+from gui.pandas_model import PandasModel
 
 
 class ParquetViewer(QWidget):
@@ -54,10 +31,18 @@ class ParquetViewer(QWidget):
         top_bar.addWidget(self.browse_button)
         layout.addLayout(top_bar)
 
-        # File list
+        # File list + optional column projection (nothing selected = all columns)
+        lists = QHBoxLayout()
         self.file_list = QListWidget()
-        self.file_list.itemSelectionChanged.connect(self.load_selected_file)
-        layout.addWidget(self.file_list)
+        self.file_list.itemSelectionChanged.connect(self.on_file_selected)
+        lists.addWidget(self.file_list, stretch=3)
+
+        self.column_list = QListWidget()
+        self.column_list.setSelectionMode(QAbstractItemView.MultiSelection)
+        self.column_list.setToolTip("Select columns to load (none = all)")
+        self.column_list.itemSelectionChanged.connect(self.load_selected_file)
+        lists.addWidget(self.column_list, stretch=1)
+        layout.addLayout(lists)
 
         self.status_label = QLabel("📂 No file loaded.")
         layout.addWidget(self.status_label)
@@ -87,15 +72,36 @@ class ParquetViewer(QWidget):
             if file.endswith(".parquet"):
                 self.file_list.addItem(file)
 
+    def on_file_selected(self):
+        selected_items = self.file_list.selectedItems()
+        if not selected_items:
+            return
+        full_path = os.path.join(self.folder, selected_items[0].text())
+
+        # Column names come from the footer alone; no data pages are read here
+        self.column_list.blockSignals(True)
+        self.column_list.clear()
+        try:
+            self.column_list.addItems(pq.read_schema(full_path).names)
+        except Exception:
+            pass  # load_selected_file reports the error
+        self.column_list.blockSignals(False)
+
+        self.load_selected_file()
+
     def load_selected_file(self):
         selected_items = self.file_list.selectedItems()
         if not selected_items:
             return
         file_name = selected_items[0].text()
         full_path = os.path.join(self.folder, file_name)
+        columns = [item.text() for item in self.column_list.selectedItems()] or None
 
         try:
-            self.df = pd.read_parquet(full_path)
+            table = pq.read_table(full_path, columns=columns, use_threads=True, pre_buffer=True)
+            # self_destruct frees each Arrow column as soon as it has been converted
+            self.df = table.to_pandas(self_destruct=True, split_blocks=True)
+            del table
             model = PandasModel(self.df)
             self.table_view.setModel(model)
             self.status_label.setText(
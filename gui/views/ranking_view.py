@@ -1,23 +1,156 @@
 # gui/views/ranking_view.py
 from core.file_converter import convert_excel_to_parquet
 from combine_utils.combine_parquet_by_date import combine_parquet_files
-from PySide6.QtWidgets import QProgressDialog, QApplication
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QProgressDialog
+from PySide6.QtCore import Qt, QThread, Signal, QElapsedTimer
 
 import os
-from datetime import timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import pandas as pd
-from core.ranking_utils import save_krx_data
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from core.ranking_utils import save_many
 
 
 
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QHBoxLayout, QComboBox, QDateEdit,
-    QPushButton, QTableWidget, QTableWidgetItem, QTextEdit, QGroupBox, QSizePolicy, QHeaderView
+    QPushButton, QTableView, QTextEdit, QGroupBox, QSizePolicy, QHeaderView
 )
 from PySide6.QtCore import QDate
 
+from gui.pandas_model import PandasModel
+
+RANKING_COLUMNS = ["순위", "종목코드", "종목명", "거래대금_순매수"]
+
+RANKING_KEYS = ["종목코드", "종목명"]
+
+# Minimum gap between progress updates sent to the GUI while combining
+PROGRESS_INTERVAL_MS = 50
+
+# (window, date) aggregates kept for quick back-and-forth navigation
+AGG_CACHE_SIZE = 64
+
+
+def read_ranking_file(file) -> pd.DataFrame | None:
+    """
+    Read the ranking columns of one per-date 순매수 parquet file, or None if it has
+    no 거래대금_순매수. The key columns come back categorical so grouping hashes
+    codes rather than Python strings; numeric sums are cast to int64 in Arrow.
+    """
+    names = pq.read_schema(file).names
+    if "거래대금_순매수" not in names:
+        return None
+    columns = [c for c in RANKING_KEYS if c in names] + ["거래대금_순매수"]
+    return ranking_frame(pq.read_table(file, columns=columns, memory_map=True))
+
+
+def read_ranking_files(files) -> dict:
+    """
+    Read the ranking columns of many per-date files in one threaded dataset scan,
+    returning {path: DataFrame}. Files with no valid 거래대금_순매수 row are left out.
+    Raises pa.ArrowException if the files' schemas cannot be unified.
+    """
+    dataset = ds.dataset([str(f) for f in files], format="parquet")
+    scanner = dataset.scanner(columns=RANKING_KEYS + ["거래대금_순매수"], use_threads=True)
+
+    batches_by_file = {}
+    for tagged in scanner.scan_batches():
+        batches_by_file.setdefault(tagged.fragment.path, []).append(tagged.record_batch)
+
+    frames = {}
+    for path, batches in batches_by_file.items():
+        df = ranking_frame(pa.Table.from_batches(batches, schema=scanner.projected_schema))
+        if not df.empty:
+            frames[Path(path)] = df
+    return frames
+
+
+def ranking_frame(table: pa.Table) -> pd.DataFrame:
+    """Ranking table → DataFrame with categorical keys and a numeric 거래대금_순매수."""
+    values = table["거래대금_순매수"]
+    if pa.types.is_integer(values.type) or pa.types.is_floating(values.type):
+        table = table.filter(pc.is_valid(values))
+        idx = table.schema.get_field_index("거래대금_순매수")
+        table = table.set_column(idx, "거래대금_순매수", pc.cast(table["거래대금_순매수"], pa.int64(), safe=False))
+        return table.to_pandas(strings_to_categorical=True)
+
+    # Some older files stored the number as text (with thousands separators)
+    df = table.to_pandas(strings_to_categorical=True)
+    df["거래대금_순매수"] = pd.to_numeric(df["거래대금_순매수"].astype(str).str.replace(",", ""), errors="coerce")
+    return df.dropna(subset=["거래대금_순매수"])
+
+
+# Log icon per convert_excel_to_parquet status
+CONVERT_ICONS = {"converted": "✅", "skipped": "ℹ️", "failed": "❌"}
+
+
+class ConvertWorker(QThread):
+    """Converts CSV/Excel downloads to Parquet on a thread pool, reporting each file."""
+    log = Signal(str)
+
+    def __init__(self, files, parent=None):
+        super().__init__(parent)
+        self.files = files
+
+    def run(self):
+        total = len(self.files)
+        counts = dict.fromkeys(CONVERT_ICONS, 0)
+        # Threads, not processes: a pool must not fork/spawn the running Qt app.
+        # pandas' CSV parser and the parquet writer release the GIL while they work.
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            futures = [pool.submit(convert_excel_to_parquet, f) for f in self.files]
+            for i, future in enumerate(as_completed(futures), 1):
+                status, message = future.result()
+                counts[status] += 1
+                self.log.emit(f"[{i}/{total}] {CONVERT_ICONS[status]} {message}")
+        self.log.emit(
+            f"✅ Parquet conversion done: {counts['converted']} converted, "
+            f"{counts['skipped']} skipped, {counts['failed']} failed."
+        )
+
+
+class CombineWorker(QThread):
+    """Runs combine_parquet_files off the GUI thread with throttled progress."""
+    progress = Signal(int)
+    log = Signal(str)
+
+    def __init__(self, input_folder, output_folder, investor, parent=None):
+        super().__init__(parent)
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.investor = investor
+
+    def run(self):
+        done = 0
+        since_emit = QElapsedTimer()
+        since_emit.start()
+
+        def update_progress(step):
+            nonlocal done
+            done += step
+            if since_emit.elapsed() >= PROGRESS_INTERVAL_MS:
+                self.progress.emit(done)
+                since_emit.restart()
+
+        try:
+            failed = combine_parquet_files(
+                source_folder=str(self.input_folder),
+                output_folder=str(self.output_folder),
+                investor_type=self.investor,
+                progress_callback=update_progress
+            )
+            self.progress.emit(done)
+            if failed:
+                self.log.emit(f"⚠️ {len(failed)} files could not be combined: {', '.join(failed)}")
+            self.log.emit(f"✅ Combined Parquet files saved to {self.output_folder.name}")
+        except Exception as e:
+            self.log.emit(f"❌ Combination failed: {e}")
+
 
 class SingleRankingPanel(QWidget):
     def __init__(self, label: str, show_controls=True, fixed_investor=None, tab_refs=None):
@@ -27,8 +160,11 @@ class SingleRankingPanel(QWidget):
         self.label = label
         self.show_controls = show_controls
         self.data_by_date = {}
+        self._sorted_dates = []  # data_by_date keys in order, rebuilt on each load
+        self._date_index = {}
         self.current_date = None
         self.current_view = None
+        self._agg_cache = OrderedDict()
 
         self.init_ui()
 
@@ -102,8 +238,12 @@ class SingleRankingPanel(QWidget):
         layout.addLayout(button_row)
 
         # Table
-        self.table = QTableWidget(20, 4)
-        self.table.setHorizontalHeaderLabels(["순위", "종목코드", "종목명", "거래대금_순매수"])
+        self.model = PandasModel(
+            pd.DataFrame(columns=RANKING_COLUMNS),
+            formatters={"거래대금_순매수": lambda v: f"{int(v):,}"},
+        )
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.verticalHeader().setVisible(False)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.table)
@@ -122,12 +262,10 @@ class SingleRankingPanel(QWidget):
         code = code_map[investor]
         dates = pd.date_range(start=start, end=end)
 
-        for d in dates:
-            date_str = d.strftime("%Y%m%d")
-            try:
-                save_krx_data(date_str, code, folder, investor)
+        for date_str, error in save_many(dates.strftime("%Y%m%d"), code, folder, investor):
+            if error is None:
                 self.append_log(f"{investor} - {date_str}: ✅ Successfully updated")
-            except Exception:
+            else:
                 self.append_log(f"{investor} - {date_str}: ❌ Download failed")
 
     def on_auto_download(self):
@@ -148,17 +286,20 @@ class SingleRankingPanel(QWidget):
             self.append_log("❌ Cannot request more than 200 dates.")
             return
 
+        pending = []
         for d in dates:
             date_str = d.strftime("%Y%m%d")
-            file_path = folder / f"{investor}_순매수_{date_str}.xlsx"
-            if file_path.exists():
+            stem = f"{investor}_순매수_{date_str}"
+            if (folder / f"{stem}.csv").exists() or (folder / f"{stem}.xlsx").exists():
                 self.append_log(f"{date_str}: Already exists")
                 continue
-            try:
-                save_krx_data(date_str, code, folder, investor)
+            pending.append(date_str)
+
+        for date_str, error in save_many(pending, code, folder, investor):
+            if error is None:
                 self.append_log(f"{date_str}: ✅ Downloaded")
-            except Exception as e:
-                self.append_log(f"{date_str}: ❌ Failed: {e}")
+            else:
+                self.append_log(f"{date_str}: ❌ Failed: {error}")
 
     def append_log(self, msg: str):
         self.log_box.append(msg)
@@ -171,18 +312,18 @@ class SingleRankingPanel(QWidget):
             self.append_log(f"❌ Folder does not exist: {folder.name}")
             return
 
-        files = list(folder.rglob("*.xlsx"))
+        files = list(folder.rglob("*.csv")) + list(folder.rglob("*.xlsx"))
         if not files:
-            self.append_log(f"ℹ️ No Excel files found in {folder.name}")
+            self.append_log(f"ℹ️ No CSV/Excel files found in {folder.name}")
             return
 
         self.append_log(f"🔄 Starting Parquet conversion: {len(files)} files")
 
-        for i, file in enumerate(files, 1):
-            convert_excel_to_parquet(file)
-            self.append_log(f"[{i}/{len(files)}] ✅ Converted: {file.name}")
-
-        self.append_log("✅ All files converted to Parquet.")
+        self.convert_btn.setEnabled(False)
+        self._convert_worker = ConvertWorker(files, self)
+        self._convert_worker.log.connect(self.append_log)
+        self._convert_worker.finished.connect(lambda: self.convert_btn.setEnabled(True))
+        self._convert_worker.start()
 
     def load_parquet_files(self):
         # Special logic for 통합 순매수
@@ -195,26 +336,27 @@ class SingleRankingPanel(QWidget):
                 return
 
             self.data_by_date.clear()
-
-            all_dates = set(foreign_panel.data_by_date.keys()) | set(institution_panel.data_by_date.keys())
-
-            for date in sorted(all_dates):
-                df_f = foreign_panel.data_by_date.get(date)
-                df_i = institution_panel.data_by_date.get(date)
-                frames = []
-
-                if df_f is not None:
-                    frames.append(df_f)
-                if df_i is not None:
-                    frames.append(df_i)
-
-                if frames:
-                    combined = pd.concat(frames)
-                    combined = combined.groupby(["종목코드", "종목명"], as_index=False)["거래대금_순매수"].sum()
-                    self.data_by_date[date] = combined
-
+            self._agg_cache.clear()
+
+            # One concat and one groupby over every (date, investor) frame,
+            # then split the totals back out by date
+            parts = {
+                (date, investor): df
+                for investor, panel in (("외국인", foreign_panel), ("기관", institution_panel))
+                for date, df in panel.data_by_date.items()
+            }
+            if parts:
+                combined = pd.concat(parts, names=["date", "investor"]).reset_index(level="date")
+                totals = combined.groupby(["date"] + RANKING_KEYS, sort=False, observed=True)["거래대금_순매수"].sum()
+                totals = totals.reset_index()
+                self.data_by_date.update(
+                    (date, group.drop(columns="date").reset_index(drop=True))
+                    for date, group in totals.groupby("date", sort=False)
+                )
+
+            self._index_dates()
             if self.data_by_date:
-                self.current_date = max(self.data_by_date.keys())
+                self.current_date = self._sorted_dates[-1]
                 self.date_label.setText(f"현재 선택된 날짜: {self.current_date}")
                 self.show_daily()
             else:
@@ -234,38 +376,53 @@ class SingleRankingPanel(QWidget):
             return
 
         self.data_by_date.clear()
+        self._agg_cache.clear()
+
+        # Each file's date is the last "_" part of its name; parse them all in one call
+        dates = pd.to_datetime([f.stem.split("_")[-1] for f in files], format="%Y%m%d", errors="coerce")
+        dated = []
+        for file, date in zip(files, dates):
+            if pd.isna(date):
+                self.append_log(f"❌ Failed to load {file.name}: no YYYYMMDD date in name")
+            else:
+                dated.append((file, date.date()))
+
+        # Normally every file is decoded in one threaded scan; if the schemas
+        # disagree (e.g. a legacy text column), fall back to reading file by file
+        try:
+            frames = read_ranking_files([file for file, _ in dated]) if dated else {}
+        except pa.ArrowException:
+            frames = None
 
-        for file in files:
+        for file, date_obj in dated:
             try:
-                date_part = file.stem.split("_")[-1]
-                date_obj = pd.to_datetime(date_part).date()
-                df = pd.read_parquet(file)
-                if '거래대금_순매수' not in df.columns:
-                    continue
-                df['거래대금_순매수'] = pd.to_numeric(df['거래대금_순매수'], errors='coerce')
-                df.dropna(subset=['거래대금_순매수'], inplace=True)
-                self.data_by_date[date_obj] = df
+                df = frames.get(file) if frames is not None else read_ranking_file(file)
+                if df is not None:
+                    self.data_by_date[date_obj] = df
             except Exception as e:
                 self.append_log(f"❌ Failed to load {file.name}: {e}")
 
+        self._index_dates()
         if self.data_by_date:
-            self.current_date = max(self.data_by_date.keys())
+            self.current_date = self._sorted_dates[-1]
             self.date_label.setText(f"현재 선택된 날짜: {self.current_date}")
             self.show_daily()
         else:
             self.append_log("❌ No usable Parquet data found.")
 
-    def display_top_20(self, df: pd.DataFrame):
-        self.table.setRowCount(0)
-        df_sorted = df.sort_values(by="거래대금_순매수", ascending=False).head(20).copy()
-        df_sorted.reset_index(drop=True, inplace=True)
+    def _index_dates(self):
+        self._sorted_dates = sorted(self.data_by_date)
+        self._date_index = {d: i for i, d in enumerate(self._sorted_dates)}
 
-        for idx, row in df_sorted.iterrows():
-            self.table.insertRow(idx)
-            self.table.setItem(idx, 0, QTableWidgetItem(str(idx + 1)))
-            self.table.setItem(idx, 1, QTableWidgetItem(str(row["종목코드"])))
-            self.table.setItem(idx, 2, QTableWidgetItem(str(row["종목명"])))
-            self.table.setItem(idx, 3, QTableWidgetItem(f"{int(row['거래대금_순매수']):,}"))
+    def display_top_20(self, df: pd.DataFrame):
+        df_sorted = df.nlargest(20, "거래대금_순매수")
+        top = pd.DataFrame({
+            "순위": range(1, len(df_sorted) + 1),
+            "종목코드": df_sorted["종목코드"].to_numpy(),
+            "종목명": df_sorted["종목명"].to_numpy(),
+            "거래대금_순매수": df_sorted["거래대금_순매수"].to_numpy(),
+        })
+        self.model.setDataFrame(top)
 
     def show_daily(self):
         if not self.current_date:
@@ -275,41 +432,55 @@ class SingleRankingPanel(QWidget):
             self.current_view = "daily"
             self.display_top_20(df)
 
+    def window_aggregate(self, window: int) -> pd.DataFrame:
+        """
+        거래대금_순매수 summed over the `window` most recent dates up to current_date.
+        Results are cached until load_parquet_files repopulates data_by_date.
+        """
+        key = (window, self.current_date)
+        cached = self._agg_cache.get(key)
+        if cached is not None:
+            self._agg_cache.move_to_end(key)
+            return cached
+
+        i = self._date_index[self.current_date]
+        dates = self._sorted_dates[max(0, i - window + 1):i + 1]
+        combined = pd.concat([self.data_by_date[d] for d in dates])
+        # Group order is irrelevant: display_top_20 picks the leaders by value
+        grouped = combined.groupby(RANKING_KEYS, as_index=False, sort=False, observed=True)["거래대금_순매수"].sum()
+
+        self._agg_cache[key] = grouped
+        if len(self._agg_cache) > AGG_CACHE_SIZE:
+            self._agg_cache.popitem(last=False)
+        return grouped
+
     def show_5day(self):
         if not self.current_date:
             return
-        dates = sorted([d for d in self.data_by_date if d <= self.current_date], reverse=True)[:5]
-        combined = pd.concat([self.data_by_date[d] for d in dates])
-        grouped = combined.groupby(["종목코드", "종목명"], as_index=False)["거래대금_순매수"].sum()
         self.current_view = "5day"
-        self.display_top_20(grouped)
+        self.display_top_20(self.window_aggregate(5))
 
     def show_10day(self):
         if not self.current_date:
             return
-        dates = sorted([d for d in self.data_by_date if d <= self.current_date], reverse=True)[:10]
-        combined = pd.concat([self.data_by_date[d] for d in dates])
-        grouped = combined.groupby(["종목코드", "종목명"], as_index=False)["거래대금_순매수"].sum()
         self.current_view = "10day"
-        self.display_top_20(grouped)
+        self.display_top_20(self.window_aggregate(10))
 
     def prev_date(self):
         if not self.current_date:
             return
-        dates = sorted(self.data_by_date.keys())
-        idx = dates.index(self.current_date)
+        idx = self._date_index[self.current_date]
         if idx > 0:
-            self.current_date = dates[idx - 1]
+            self.current_date = self._sorted_dates[idx - 1]
             self.date_label.setText(f"현재 선택된 날짜: {self.current_date}")
             self.refresh_current_view()
 
     def next_date(self):
         if not self.current_date:
             return
-        dates = sorted(self.data_by_date.keys())
-        idx = dates.index(self.current_date)
-        if idx < len(dates) - 1:
-            self.current_date = dates[idx + 1]
+        idx = self._date_index[self.current_date]
+        if idx < len(self._sorted_dates) - 1:
+            self.current_date = self._sorted_dates[idx + 1]
             self.date_label.setText(f"현재 선택된 날짜: {self.current_date}")
             self.refresh_current_view()
 
@@ -336,29 +507,25 @@ class SingleRankingPanel(QWidget):
             self.append_log(f"❌ No parquet files found to combine.")
             return
 
-        # ✅ Create progress dialog
+        # ✅ Create progress dialog (the combine cannot be interrupted midway)
         progress = QProgressDialog("Combining files...", "Cancel", 0, total, self)
+        progress.setCancelButton(None)
         progress.setWindowTitle("Combining Parquet Files")
         progress.setWindowModality(Qt.WindowModal)
         progress.setMinimumDuration(0)
         progress.setValue(0)
 
-        def update_progress(step):
-            progress.setValue(progress.value() + step)
-            QApplication.processEvents()
-
-        try:
-            combine_parquet_files(
-                source_folder=str(input_folder),
-                output_folder=str(output_folder),
-                investor_type=investor,
-                progress_callback=update_progress  # ✅ Hooked
-            )
-            self.append_log(f"✅ Combined Parquet files saved to {output_folder.name}")
-        except Exception as e:
-            self.append_log(f"❌ Combination failed: {e}")
-        finally:
-            progress.close()
+        # The combine runs on a worker thread; progress arrives as queued signals
+        # at most every PROGRESS_INTERVAL_MS instead of a processEvents per file
+        worker = CombineWorker(input_folder, output_folder, investor, self)
+        worker.progress.connect(progress.setValue)
+        worker.log.connect(self.append_log)
+        worker.finished.connect(progress.close)
+        worker.finished.connect(lambda: self.combine_btn.setEnabled(True))
+
+        self.combine_btn.setEnabled(False)
+        self._combine_worker = worker
+        worker.start()
 
 
 class RankingView(QWidget):
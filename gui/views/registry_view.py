@@ -2,18 +2,27 @@
 
 from pathlib import Path
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QLabel, QHBoxLayout, QMessageBox
+    QWidget, QVBoxLayout, QPushButton, QTableView, QLabel, QHBoxLayout, QMessageBox
 )
 from PySide6.QtCore import Qt
 import pandas as pd
 from core.registry_manager import refresh_registry, load_registry
+from gui.pandas_model import PandasModel
+
+# Background of the status column per value
+STATUS_COLORS = {"success": Qt.green, "fail": Qt.red, "empty": Qt.yellow}
+
+# Columns shown in the table; mtime_ns/size are only the registry's rescan bookkeeping
+DISPLAY_COLUMNS = ["file_path", "folder", "date", "parquet_exists", "rows", "status"]
 
 
 class RegistryView(QWidget):
     def __init__(self, base_dir: Path):
         super().__init__()
         self.base_dir = base_dir
-        self.table = QTableWidget()
+        self.model = PandasModel(backgrounds={"status": STATUS_COLORS})
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.init_ui()
         self.load_registry_data()
 
@@ -30,38 +39,24 @@ class RegistryView(QWidget):
         layout.addLayout(header)
         layout.addWidget(self.table)
 
-    def load_registry_data(self):
+    def load_registry_data(self, df: pd.DataFrame | None = None):
         try:
-            df = load_registry(self.base_dir)
+            if df is None:
+                df = load_registry(self.base_dir)
             if df.empty:
                 self.show_message("No registry data found.")
                 return
 
-            self.table.setColumnCount(len(df.columns))
-            self.table.setRowCount(len(df))
-            self.table.setHorizontalHeaderLabels(df.columns)
-
-            for row in range(len(df)):
-                for col, column_name in enumerate(df.columns):
-                    value = str(df.iloc[row][column_name])
-                    item = QTableWidgetItem(value)
-                    if column_name == "status":
-                        if value == "success":
-                            item.setBackground(Qt.green)
-                        elif value == "fail":
-                            item.setBackground(Qt.red)
-                        elif value == "empty":
-                            item.setBackground(Qt.yellow)
-                    self.table.setItem(row, col, item)
-
+            # Cells are produced on demand by the model; only visible rows are painted
+            self.model.setDataFrame(df[[c for c in DISPLAY_COLUMNS if c in df.columns]])
             self.table.resizeColumnsToContents()
 
         except Exception as e:
             self.show_message(f"Error loading registry: {e}")
 
     def refresh_clicked(self):
-        refresh_registry(self.base_dir)
-        self.load_registry_data()
+        # refresh_registry already returns the frame it saved; no need to re-read the JSON
+        self.load_registry_data(refresh_registry(self.base_dir))
 
     def show_message(self, msg):
         QMessageBox.information(self, "Registry Info", msg)
@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from core import registry_manager as rm
+
+
+def _write_krx_csv(path: Path, rows: int):
+    body = "".join(f"{i:06d},{i * 100}\n" for i in range(rows))
+    path.write_bytes(("종목코드,거래대금_순매수\n" + body).encode("euc-kr"))
+
+
+@pytest.fixture
+def base_dir(tmp_path):
+    data = tmp_path / "외국인_순매수_Data"
+    data.mkdir()
+    _write_krx_csv(data / "외국인_순매수_20240102.csv", 3)
+    _write_krx_csv(data / "외국인_순매수_20240103.csv", 0)
+    _write_krx_csv(data / "undated.csv", 1)
+    (data / "broken.xlsx").write_bytes(b"not a zip")
+    return tmp_path
+
+
+def test_sidecar_and_json_load_identically(base_dir):
+    refreshed = rm.refresh_registry(base_dir)
+    registry_json = base_dir / "file_registry.json"
+
+    from_sidecar = rm._read_sidecar(registry_json)
+    assert from_sidecar is not None
+    from_sidecar = rm._normalize_registry(from_sidecar)
+    from_json = rm._read_registry_json(registry_json)
+
+    pd.testing.assert_frame_equal(from_sidecar, from_json)
+    pd.testing.assert_frame_equal(from_json, rm._normalize_registry(refreshed))
+    assert sorted(from_json["status"]) == ["empty", "fail", "success", "success"]
+    assert "20240102" in set(from_json["date"])
+
+
+def test_stale_sidecar_falls_back_to_json(base_dir):
+    rm.refresh_registry(base_dir)
+    registry_json = base_dir / "file_registry.json"
+    fresh = rm.load_registry(base_dir)
+
+    st = registry_json.stat()
+    os.utime(registry_json, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert rm._read_sidecar(registry_json) is None
+    pd.testing.assert_frame_equal(rm.load_registry(base_dir), fresh)
+
+
+def test_empty_registry_has_registry_dtypes(tmp_path):
+    missing = rm.load_registry(tmp_path)  # no file_registry.json yet
+    rm.refresh_registry(tmp_path)         # writes an empty registry + sidecar
+    pd.testing.assert_frame_equal(rm.load_registry(tmp_path), missing)
+    assert list(missing.columns) == list(rm.REGISTRY_DTYPES)